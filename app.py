@@ -34,12 +34,15 @@ if 'pizza_counter' not in st.session_state:
     from utils.pizza_counter import PizzaCounter
     st.session_state.pizza_counter = PizzaCounter()
 
-# Initialize session state variables
-if 'current_processing' not in st.session_state:
-    st.session_state.current_processing = {}
-
 st.markdown("# 🍕 Pizza Detection Dashboard")
 
+# Model loads in the background; show its state until it is ready
+startup_status = st.session_state.pizza_counter.get_startup_status()
+if startup_status['model_status'] == 'loading':
+    st.info("⏳ Model loading in the background - uploads are queued and start once it is ready")
+elif startup_status['model_status'] == 'error':
+    st.error(f"❌ Model failed to load: {startup_status['model_error']}")
+
 selected = option_menu(
     menu_title="Navigation",
     options=["Dashboard", "Video Library", "Analytics", "Settings"],
@@ -81,29 +84,14 @@ elif selected == "Settings":
 # Show processing notification on other tabs
 if selected != "Dashboard":
     counter = st.session_state.pizza_counter
-    active_processing = any(
-        key.startswith("processing_") and st.session_state[key].get("active", False)
-        for key in st.session_state.keys()
-    )
+    active_jobs = counter.job_queue.active_jobs()
     
-    if active_processing:
-        for key in st.session_state.keys():
-            if key.startswith("processing_") and st.session_state[key].get("active", False):
-                status = st.session_state[key]
-                filename = status.get("filename", "Unknown")
-                
-                # Read from shared_progress if available
-                shared_progress = status.get("shared_progress", {})
-                progress_lock = status.get("lock")
-                
-                if progress_lock:
-                    try:
-                        with progress_lock:
-                            progress = shared_progress.get("value", 0)
-                    except:
-                        progress = counter.processing_videos.get(filename, {}).get("progress", 0)
-                else:
-                    progress = counter.processing_videos.get(filename, {}).get("progress", 0)
-                
-                st.info(f"🔄 Video processing in progress: **{filename}** ({progress:.1f}%) - Go to Dashboard to see details")
-                break
+    if active_jobs:
+        running = [job for job in active_jobs if job['status'] == 'running']
+        if running:
+            job = running[0]
+            progress = (counter.job_queue.get_progress(job) or {}).get('progress', 0)
+            st.info(f"🔄 Video processing in progress: **{job['filename']}** ({progress:.1f}%), "
+                    f"{len(active_jobs) - 1} more in queue - Go to Dashboard to see details")
+        else:
+            st.info(f"⏸️ {len(active_jobs)} video(s) queued for processing - Go to Dashboard to see details")
@@ -0,0 +1,174 @@
+"""Processing benchmark on deterministic synthetic videos.
+
+    python -m benchmarks.run_benchmark --sizes 640x360,1280x720 --seconds 20 --output bench.json
+
+Needs only the local YOLO weights: no network, no GPU. With --offline (or
+when MONGODB_URI is unreachable) writes go to the in-process write buffer
+instead of MongoDB, and are still counted. Online runs write to their own
+database (--database, pizza_detection_bench by default), never the app's,
+and track files go under --video-dir rather than videos/tracks.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import psutil
+
+from benchmarks.synthetic_video import generate_synthetic_video, DEFAULT_SYNTHETIC_OPTIONS
+
+# Deliberately unroutable so the client fails fast and writes are buffered
+OFFLINE_MONGODB_URI = "mongodb://127.0.0.1:1"
+BENCHMARK_DATABASE = "pizza_detection_bench"
+
+class PeakRSSSampler:
+    """Samples this process's resident set size on a background thread"""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+def count_db_writes(counter):
+    """Start counting every write (direct or buffered) that goes through counter._db_write.
+
+    Counting happens inside _db_write itself, so stores that captured the
+    bound method at startup (settings, rollups, feedback counters) are included.
+    """
+    counts = Counter()
+    counter.write_counts = counts
+    return counts
+
+def host_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'commit': commit,
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'memory_gb': round(psutil.virtual_memory().total / 1024 ** 3, 1)
+    }
+
+def parse_sizes(value):
+    sizes = []
+    for item in value.split(','):
+        width, height = item.lower().split('x')
+        sizes.append((int(width), int(height)))
+    return sizes
+
+def run_case(counter, video, repeat):
+    """Process one synthetic video `repeat` times and keep the fastest run"""
+    runs = []
+    for _ in range(repeat):
+        db_writes = count_db_writes(counter)
+        with PeakRSSSampler() as rss:
+            start = time.perf_counter()
+            result = counter.process_video(video['path'], os.path.basename(video['path']))
+            elapsed = time.perf_counter() - start
+        counter.write_counts = None
+        if not result.get('success'):
+            raise RuntimeError(result.get('error', 'Processing failed'))
+
+        frames = result.get('total_frames', 0)
+        runs.append({
+            'seconds': round(elapsed, 3),
+            'fps': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+            'pizza_count': result['pizza_count'],
+            'peak_rss_mb': round(rss.peak / 1024 ** 2, 1),
+            'db_writes': sum(db_writes.values()),
+            'db_writes_by_operation': dict(db_writes),
+            'stage_timings': result.get('stage_timings')
+        })
+    best = max(runs, key=lambda run: run['fps'])
+    return dict(best, runs=len(runs), fps_all=[run['fps'] for run in runs])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run_benchmark", description=__doc__.split('\n')[0])
+    parser.add_argument("--sizes", default="640x360,1280x720", help="Comma-separated WIDTHxHEIGHT list")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SYNTHETIC_OPTIONS['seconds'])
+    parser.add_argument("--fps", type=int, default=DEFAULT_SYNTHETIC_OPTIONS['fps'])
+    parser.add_argument("--objects", type=int, default=DEFAULT_SYNTHETIC_OPTIONS['objects'])
+    parser.add_argument("--idle-ratio", type=float, default=DEFAULT_SYNTHETIC_OPTIONS['idle_ratio'])
+    parser.add_argument("--seed", type=int, default=DEFAULT_SYNTHETIC_OPTIONS['seed'])
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per video; the fastest is reported")
+    parser.add_argument("--model", default="./models/yolo11n.pt", help="Local YOLO weights")
+    parser.add_argument("--offline", action="store_true", help="Use the write buffer instead of MongoDB")
+    parser.add_argument("--database", default=BENCHMARK_DATABASE, help="MongoDB database for online runs")
+    parser.add_argument("--video-dir", default="./benchmarks/videos", help="Where synthetic videos are written")
+    parser.add_argument("--output", default=None, help="JSON results path (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        print(f"Model weights not found at {args.model}; benchmarks never download them")
+        return 2
+
+    if args.offline:
+        os.environ["MONGODB_URI"] = OFFLINE_MONGODB_URI
+    # Read when utils.pizza_counter is imported; keeps benchmark rows and track files out of the app's
+    os.environ["MONGODB_DATABASE"] = args.database
+    os.environ["PIZZA_TRACKS_DIR"] = os.path.join(args.video_dir, "tracks")
+
+    from utils.pizza_counter import PizzaCounter
+    counter = PizzaCounter(model_path=args.model, start_job_workers=False)
+    counter.model_pool.wait_until_ready()
+
+    results = []
+    for width, height in parse_sizes(args.sizes):
+        options = {
+            'width': width, 'height': height, 'fps': args.fps, 'seconds': args.seconds,
+            'objects': args.objects, 'idle_ratio': args.idle_ratio, 'seed': args.seed
+        }
+        name = f"synthetic_{width}x{height}_{args.fps}fps_{args.seconds:g}s_{args.objects}obj_seed{args.seed}.mp4"
+        video = generate_synthetic_video(os.path.join(args.video_dir, name), **options)
+        print(f"▶️ {name}: {video['total_frames']} frames")
+        case = run_case(counter, video, args.repeat)
+        print(f"   {case['fps']:.1f} fps | {case['pizza_count']} counted ({video['expected_removals']} lifted) | "
+              f"peak RSS {case['peak_rss_mb']:.0f} MB | {case['db_writes']} DB writes")
+        results.append(dict(case, video=video))
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'host': host_info(),
+        'database': 'offline' if args.offline or not counter.db_available else 'mongodb',
+        'startup_timings': counter.get_startup_status()['timings'],
+        'settings': counter.get_model_settings(),
+        'results': results
+    }
+
+    output = args.output or os.path.join("benchmarks", "results", datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import os
+import cv2
+import numpy as np
+
+DEFAULT_SYNTHETIC_OPTIONS = {
+    'width': 1280,
+    'height': 720,
+    'fps': 30,
+    'seconds': 20,
+    'objects': 3,
+    'idle_ratio': 0.3,
+    'seed': 0
+}
+
+def _draw_pizza(frame, center, radius, toppings):
+    """Crust, cheese and a fixed pepperoni pattern so every frame is repeatable"""
+    x, y = int(center[0]), int(center[1])
+    cv2.circle(frame, (x, y), radius, (40, 110, 190), -1)          # crust
+    cv2.circle(frame, (x, y), int(radius * 0.85), (90, 200, 245), -1)  # cheese
+    for dx, dy in toppings:
+        cv2.circle(frame, (x + int(dx * radius), y + int(dy * radius)), max(radius // 8, 2), (30, 30, 170), -1)
+
+def _background(width, height, rng):
+    """Static counter-top texture"""
+    base = np.full((height, width, 3), (150, 160, 165), dtype=np.uint8)
+    noise = rng.randint(0, 20, size=(height // 8 + 1, width // 8 + 1, 1), dtype=np.uint8)
+    noise = cv2.resize(np.repeat(noise, 3, axis=2), (width, height), interpolation=cv2.INTER_NEAREST)
+    return cv2.add(base, noise)
+
+def plan_objects(options):
+    """Deterministic trajectories: each object sits still, then is lifted up and out of frame"""
+    rng = np.random.RandomState(options['seed'])
+    width, height = options['width'], options['height']
+    total_frames = int(options['fps'] * options['seconds'])
+    # The idle share of the video has no pizza movement at all
+    active_frames = max(int(total_frames * (1 - options['idle_ratio'])), 1)
+    plans = []
+    for index in range(options['objects']):
+        radius = int(rng.uniform(0.06, 0.1) * min(width, height))
+        start = int(index * active_frames / max(options['objects'], 1))
+        rest = int(rng.uniform(0.2, 0.4) * active_frames / max(options['objects'], 1)) + 1
+        lift = int(options['fps'] * rng.uniform(1.0, 2.0))
+        x = rng.uniform(radius, width - radius)
+        y = rng.uniform(height * 0.55, height - radius)
+        toppings = [tuple(rng.uniform(-0.5, 0.5, 2)) for _ in range(6)]
+        plans.append({
+            'radius': radius, 'start': start, 'rest': rest, 'lift': lift,
+            'x': x, 'y': y, 'toppings': toppings, 'drift': rng.uniform(-2, 2)
+        })
+    return plans, total_frames
+
+def object_position(plan, frame_index):
+    """Center of an object at a frame, or None when it is not in view"""
+    offset = frame_index - plan['start']
+    if offset < 0:
+        return None
+    if offset < plan['rest']:
+        return plan['x'], plan['y']
+    lifted = offset - plan['rest']
+    if lifted > plan['lift']:
+        return None
+    progress = lifted / plan['lift']
+    return plan['x'] + plan['drift'] * lifted, plan['y'] - progress * (plan['y'] + plan['radius'])
+
+def generate_synthetic_video(output_path, **options):
+    """Write a deterministic MP4 of pizza-like objects being lifted off a counter.
+
+    Same options and seed always give the same frames, so runs on different
+    commits and hosts process identical input. Returns the options used plus
+    the number of objects that are lifted out of view (the expected count).
+    """
+    options = dict(DEFAULT_SYNTHETIC_OPTIONS, **options)
+    rng = np.random.RandomState(options['seed'])
+    width, height, fps = options['width'], options['height'], options['fps']
+    plans, total_frames = plan_objects(options)
+    background = _background(width, height, rng)
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    try:
+        for frame_index in range(total_frames):
+            frame = background.copy()
+            for plan in plans:
+                position = object_position(plan, frame_index)
+                if position is not None:
+                    _draw_pizza(frame, position, plan['radius'], plan['toppings'])
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    expected = sum(1 for plan in plans if plan['start'] + plan['rest'] + plan['lift'] < total_frames)
+    return dict(options, path=output_path, total_frames=total_frames, expected_removals=expected)
@@ -1,8 +1,13 @@
 import streamlit as st
 import os
 import time
+import pandas as pd
 from utils.helpers import format_file_size, format_time_ago, get_status_color, get_status_icon
 from utils.helpers import extract_video_thumbnail, get_video_info
+from utils.helpers import DisplayFrameEncoder, STREAM_DISPLAY_WIDTH, STREAM_JPEG_QUALITY
+from utils.track_store import get_tracks_path
+from utils.video_export import get_annotated_path
+from utils.timeline import timeline_rows, count_in_range
 
 def display_video_card(video_data):
     """Display individual video card with original layout"""
@@ -141,20 +146,36 @@ def display_video_stream_modal(filename):
         frame_placeholder = st.empty()
         stats_placeholder = st.empty()
         
+        counter = st.session_state.pizza_counter
+        
         # Check if stream is active
-        if st.session_state.get(f"stream_active_{filename}", False):
+        if st.session_state.get(f"stream_active_{filename}", False) and not counter.model_ready:
+            stats_placeholder.info("⏳ Model is loading, the stream will start once it is ready")
+        elif st.session_state.get(f"stream_active_{filename}", False):
             import cv2
             import time
-            from PIL import Image
             
             counter = st.session_state.pizza_counter
             cap = cv2.VideoCapture(video_path)
+            encoder = DisplayFrameEncoder(
+                width=STREAM_DISPLAY_WIDTH,
+                quality=st.session_state.get('stream_jpeg_quality', STREAM_JPEG_QUALITY)
+            )
+            
+            def show_frame(frame):
+                # Resize + JPEG encode once; unchanged frames are not resent
+                frame_bytes, changed = encoder.encode(frame)
+                if changed:
+                    frame_placeholder.image(frame_bytes, width=STREAM_DISPLAY_WIDTH, use_container_width=False)
             
             if cap.isOpened():
                 total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
                 fps = cap.get(cv2.CAP_PROP_FPS) or 25
                 frame_count = 0
                 
+                # Own tracker for this stream so it never shares tracks with processing jobs
+                tracker_session = counter.model_pool.session()
+                
                 # Initialize tracking for pizza counting
                 tracked_pizzas = set()  # Set to track unique pizza IDs
                 total_pizza_detected = st.session_state.get(f"stream_pizza_count_{filename}", 0)
@@ -173,49 +194,36 @@ def display_video_stream_modal(filename):
                     if frame_count % 3 == 0:
                         # Use tracking instead of simple detection
                         try:
-                            results = counter.model.track(
+                            tracked = tracker_session.track(
                                 frame,
-                                persist=True,
                                 classes=[counter.pizza_class_id],
-                                conf=counter.confidence_threshold,
-                                tracker="bytetrack.yaml"
+                                conf=counter.confidence_threshold
                             )
                             
                             annotated_frame = frame.copy()
                             current_frame_pizzas = 0
                             
-                            if (results[0].boxes is not None and 
-                                results[0].boxes.id is not None and 
-                                len(results[0].boxes.id) > 0):
-                                
-                                boxes = results[0].boxes.xyxy.cpu().numpy()
-                                track_ids = results[0].boxes.id.int().cpu().tolist()
-                                confidences = results[0].boxes.conf.cpu().tolist()
-                                
-                                for box, track_id, conf in zip(boxes, track_ids, confidences):
-                                    if conf >= counter.confidence_threshold:
-                                        # Count unique tracked pizzas
-                                        if track_id not in tracked_pizzas:
-                                            tracked_pizzas.add(track_id)
-                                            total_pizza_detected += 1
-                                        
-                                        current_frame_pizzas += 1
-                                        
-                                        # Draw bounding box
-                                        x1, y1, x2, y2 = box.astype(int)
-                                        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                        cv2.putText(annotated_frame, f'Pizza {track_id}: {conf:.2f}', 
-                                                  (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                            for box, track_id, conf in zip(tracked.xyxy, tracked.track_ids.tolist(),
+                                                           tracked.confidences.tolist()):
+                                if conf >= counter.confidence_threshold:
+                                    # Count unique tracked pizzas
+                                    if track_id not in tracked_pizzas:
+                                        tracked_pizzas.add(track_id)
+                                        total_pizza_detected += 1
+                                    
+                                    current_frame_pizzas += 1
+                                    
+                                    # Draw bounding box
+                                    x1, y1, x2, y2 = box.astype(int)
+                                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                                    cv2.putText(annotated_frame, f'Pizza {track_id}: {conf:.2f}', 
+                                              (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
                             
                             # Update session state
                             st.session_state[f"stream_pizza_count_{filename}"] = total_pizza_detected
                             
-                            # Convert to RGB and resize for proper display
-                            annotated_frame_rgb = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
-                            frame_pil = Image.fromarray(annotated_frame_rgb)
-                            
                             # Display frame with proper sizing
-                            frame_placeholder.image(frame_pil, width=800, use_container_width=False)
+                            show_frame(annotated_frame)
                             
                             # Display stats
                             stats_placeholder.markdown(f"""
@@ -226,16 +234,12 @@ def display_video_stream_modal(filename):
                             
                         except Exception as e:
                             # Display original frame if tracking fails
-                            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                            frame_pil = Image.fromarray(frame_rgb)
-                            frame_placeholder.image(frame_pil, width=800, use_container_width=False)
+                            show_frame(frame)
                             stats_placeholder.error(f"Detection error: {str(e)}")
                     
                     else:
                         # Show original frame for skipped frames
-                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        frame_pil = Image.fromarray(frame_rgb)
-                        frame_placeholder.image(frame_pil, width=800, use_container_width=False)
+                        show_frame(frame)
                     
                     # Control playback speed
                     time.sleep(1.0 / fps if fps > 0 else 0.033)
@@ -294,6 +298,86 @@ def display_video_details_modal(video_data):
             - **Processing Time:** {video_data.get('processing_time', 'N/A')}
             - **Average Confidence:** {video_data.get('avg_confidence', 'N/A')}
             """)
+            
+            # Annotated export, if one was written during processing
+            counter = st.session_state.pizza_counter
+            video_info = counter.get_video_info(filename)
+            annotated_export = video_info.get('annotated_export') if isinstance(video_info, dict) else None
+            if annotated_export and os.path.exists(annotated_export.get('path', '')):
+                st.markdown("#### Annotated Video")
+                if annotated_export.get('warning'):
+                    st.warning(annotated_export['warning'])
+                st.video(annotated_export['path'])
+                st.caption(
+                    f"{annotated_export.get('resolution', '')} | "
+                    f"{annotated_export.get('frames_written', 0)} frames written, "
+                    f"{annotated_export.get('frames_dropped', 0)} dropped"
+                )
+            
+            # Where processing time went, slowest stage first
+            stage_timings = video_info.get('stage_timings') if isinstance(video_info, dict) else None
+            if stage_timings and stage_timings.get('stages'):
+                st.markdown("#### Stage Timings")
+                rows = sorted(stage_timings['stages'].items(), key=lambda item: item[1]['total_ms'], reverse=True)
+                st.dataframe(
+                    [{
+                        'Stage': stage,
+                        'Share': f"{timing['share'] * 100:.1f}%",
+                        'p50 (ms)': timing['p50_ms'],
+                        'p95 (ms)': timing['p95_ms'],
+                        'p99 (ms)': timing['p99_ms'],
+                        'Calls': timing['count']
+                    } for stage, timing in rows],
+                    hide_index=True,
+                    use_container_width=True
+                )
+                st.caption(f"{video_info.get('resolution', '')} | {stage_timings['wall_seconds']:.1f}s wall time")
+            
+            # Count timeline from the stored buckets (no detection scan)
+            timeline = counter.get_video_timeline(filename)
+            if timeline and timeline.get('counts'):
+                st.markdown("#### Count Timeline")
+                bucket_seconds = timeline['bucket_seconds']
+                duration = len(timeline['counts']) * bucket_seconds
+                start, end = st.slider(
+                    "Range (seconds)",
+                    min_value=0,
+                    max_value=duration,
+                    value=(0, duration),
+                    step=bucket_seconds,
+                    key=f"timeline_range_{filename}"
+                )
+                rows = timeline_rows(timeline, start, end)
+                if rows:
+                    st.bar_chart(pd.DataFrame(rows).set_index('time')[['pizzas', 'active_tracks']])
+                st.caption(f"🍕 {count_in_range(timeline, start, end)} pizzas between "
+                           f"{start}s and {end}s · {bucket_seconds}s buckets")
+
+            # Recount from recorded tracks with the current thresholds (no re-inference)
+            track_file = video_info.get('track_file') if isinstance(video_info, dict) else None
+            if track_file:
+                st.markdown("#### Recount")
+                st.caption(f"{track_file.get('rows', 0)} tracked boxes over {track_file.get('frames', 0)} sampled frames")
+                if st.button("🔁 Recount with current settings", key=f"recount_{filename}"):
+                    st.session_state[f"recount_result_{filename}"] = counter.recount_video(filename)
+                recount = st.session_state.get(f"recount_result_{filename}")
+                if recount and recount.get('success'):
+                    st.info(f"🍕 {recount['pizza_count']} pizzas at movement {recount['movement_threshold']}, "
+                            f"confidence {recount['confidence_threshold']:.2f} ({recount['seconds']:.2f}s)")
+                    if st.button("💾 Save recount", key=f"save_recount_{filename}"):
+                        counter.recount_video(
+                            filename,
+                            save=True,
+                            movement_threshold=recount['movement_threshold'],
+                            confidence_threshold=recount['confidence_threshold'],
+                            vertical_threshold=recount['vertical_threshold'],
+                            min_track_length=recount['min_track_length'],
+                            track_window=recount['track_window']
+                        )
+                        st.session_state.pop(f"recount_result_{filename}", None)
+                        st.success("Recount saved")
+                elif recount:
+                    st.error(recount.get('error', 'Recount failed'))
         
         with col2:
             st.markdown("#### Detection Statistics")
@@ -308,11 +392,13 @@ def display_video_details_modal(video_data):
                     
                     if detections:
                         confidences = [d.get('confidence', 0) for d in detections]
+                        feedback = counter.get_feedback_accuracy(filename)
                         st.markdown(f"""
                         - **Total Detections:** {len(detections)}
                         - **Max Confidence:** {max(confidences):.2f}
                         - **Min Confidence:** {min(confidences):.2f}
                         - **Avg Confidence:** {sum(confidences)/len(confidences):.2f}
+                        - **Feedback Accuracy:** {feedback['accuracy']:.1f}% ({feedback['correct']}/{feedback['total']} correct)
                         """)
                         
                         # Show recent detections
@@ -338,12 +424,13 @@ def delete_video(filename):
         video_path = f"videos/{filename}"
         if os.path.exists(video_path):
             os.remove(video_path)
+        for derived_path in (get_tracks_path(filename), get_annotated_path(filename)):
+            if os.path.exists(derived_path):
+                os.remove(derived_path)
         
         # Delete from database
         counter = st.session_state.pizza_counter
-        if counter.db_available:
-            counter.videos_collection.delete_one({'filename': filename})
-            counter.detections_collection.delete_many({'filename': filename})
+        counter.delete_video_records(filename)
         
         st.success(f"Video {filename} deleted successfully")
     except Exception as e:
@@ -5,7 +5,16 @@ from PIL import Image
 import threading
 import time
 import os
+import uuid
 from utils.helpers import convert_cv2_to_pil, convert_pil_to_bytes
+from utils.helpers import DisplayFrameEncoder, STREAM_DISPLAY_WIDTH, STREAM_JPEG_QUALITY
+
+# Seconds a stream decoder may sit unused before it is released
+STREAM_CAPTURE_IDLE_TIMEOUT = 60
+
+# Open decoders keyed by stream session, shared across reruns
+_stream_captures = {}
+_stream_captures_lock = threading.Lock()
 
 def display_video_stream_modal(video_filename):
     """Display video streaming modal with real-time detection"""
@@ -85,6 +94,7 @@ def pause_video_stream():
 
 def stop_video_stream():
     """Stop video stream"""
+    release_stream_capture()
     st.session_state.stream_active = False
     st.session_state.stream_paused = False
     st.info("⏹️ Stream stopped")
@@ -95,7 +105,7 @@ def close_stream_modal():
     
     # Clear stream-related session state
     keys_to_clear = ['stream_video', 'stream_active', 'stream_paused', 
-                     'current_video', 'detection_count', 'current_frame']
+                     'current_video', 'detection_count', 'current_frame', 'stream_frame_encoder']
     
     for key in keys_to_clear:
         if key in st.session_state:
@@ -103,29 +113,134 @@ def close_stream_modal():
     
     st.rerun()
 
+def get_stream_session_id():
+    """Get the id that owns this session's stream decoder"""
+    if 'stream_session_id' not in st.session_state:
+        st.session_state.stream_session_id = uuid.uuid4().hex
+    return st.session_state.stream_session_id
+
+def release_idle_stream_captures(timeout=STREAM_CAPTURE_IDLE_TIMEOUT):
+    """Release decoders whose sessions stopped reading frames"""
+    now = time.time()
+    with _stream_captures_lock:
+        stale = [sid for sid, entry in _stream_captures.items()
+                 if now - entry['last_used'] > timeout]
+        entries = [_stream_captures.pop(sid) for sid in stale]
+    for entry in entries:
+        _release_entry(entry)
+
+def _release_entry(entry):
+    # Waits for an in-flight read; a reader holding the entry reopens a fresh one
+    with entry['lock']:
+        entry['released'] = True
+        if entry['cap'] is not None:
+            entry['cap'].release()
+            entry['cap'] = None
+
+def _reap_idle_stream_captures():
+    while True:
+        time.sleep(STREAM_CAPTURE_IDLE_TIMEOUT / 2)
+        try:
+            release_idle_stream_captures()
+        except Exception as e:
+            print(f"Stream capture reaper error: {e}")
+
+_reaper_thread = None
+
+def start_stream_capture_reaper():
+    """Release idle decoders from a background thread, even if no session reads again"""
+    global _reaper_thread
+    with _stream_captures_lock:
+        if _reaper_thread is None:
+            _reaper_thread = threading.Thread(target=_reap_idle_stream_captures, name="stream-capture-reaper", daemon=True)
+            _reaper_thread.start()
+
+def release_stream_capture():
+    """Release the decoder held by the current session"""
+    session_id = st.session_state.get('stream_session_id')
+    if session_id is None:
+        return
+    with _stream_captures_lock:
+        entry = _stream_captures.pop(session_id, None)
+    if entry:
+        _release_entry(entry)
+
+def read_stream_frame(video_path, frame_index):
+    """Read one frame, reusing the session decoder for sequential playback.
+    Returns None if the video cannot be opened, otherwise (ret, frame)."""
+    start_stream_capture_reaper()
+    session_id = get_stream_session_id()
+    
+    # The global lock only guards the dictionary; decoding happens under the
+    # capture's own lock so viewers never wait on each other
+    stale = None
+    with _stream_captures_lock:
+        entry = _stream_captures.get(session_id)
+        if entry and entry['video_path'] != video_path:
+            stale = _stream_captures.pop(session_id)
+            entry = None
+        if entry is None:
+            entry = {'cap': None, 'video_path': video_path, 'position': 0,
+                     'lock': threading.Lock(), 'released': False}
+            _stream_captures[session_id] = entry
+        entry['last_used'] = time.time()
+    
+    if stale:
+        _release_entry(stale)
+    
+    with entry['lock']:
+        if entry['released']:
+            # Reaped between lookup and read
+            return read_stream_frame(video_path, frame_index)
+        if entry['cap'] is None:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                cap.release()
+                with _stream_captures_lock:
+                    if _stream_captures.get(session_id) is entry:
+                        del _stream_captures[session_id]
+                return None
+            entry['cap'] = cap
+        cap = entry['cap']
+        
+        # Only seek when playback jumped, sequential reads decode one frame
+        if entry['position'] != frame_index:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        
+        ret, frame = cap.read()
+        entry['position'] = frame_index + 1 if ret else frame_index
+        return ret, frame
+
+def get_stream_encoder():
+    """This session's display encoder, kept across reruns and rebuilt when the quality changes"""
+    quality = st.session_state.get('stream_jpeg_quality', STREAM_JPEG_QUALITY)
+    encoder = st.session_state.get('stream_frame_encoder')
+    if encoder is None or encoder.quality != quality:
+        encoder = DisplayFrameEncoder(width=STREAM_DISPLAY_WIDTH, quality=quality)
+        st.session_state.stream_frame_encoder = encoder
+    return encoder
+
 def display_stream_frame(placeholder, video_filename):
     """Display current stream frame with detections"""
     try:
         counter = st.session_state.pizza_counter
         video_path = f"./videos/{video_filename}"
         
-        # Open video capture
-        cap = cv2.VideoCapture(video_path)
+        read_result = read_stream_frame(video_path, st.session_state.get('current_frame', 0))
         
-        if not cap.isOpened():
+        if read_result is None:
             st.error("Could not open video file")
             return
         
-        # Set frame position if resuming
-        if 'current_frame' in st.session_state:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, st.session_state.current_frame)
-        
-        ret, frame = cap.read()
-        cap.release()
+        ret, frame = read_result
         
         if ret:
             # Process frame for detection
-            result = counter.process_frame_for_stream(frame)
+            result = counter.process_frame_for_stream(
+                frame,
+                annotate=st.session_state.get('show_boxes', True),
+                show_confidence=st.session_state.get('show_confidence', True)
+            )
             
             if 'error' in result:
                 st.error(f"Detection error: {result['error']}")
@@ -135,11 +250,12 @@ def display_stream_frame(placeholder, video_filename):
             processed_frame = result['frame']
             detections = result['detections']
             
-            # Convert to PIL and display
-            pil_image = convert_cv2_to_pil(processed_frame)
+            # Resize and JPEG encode once; identical consecutive frames reuse the last bytes
+            frame_bytes, _ = get_stream_encoder().encode(processed_frame)
             
-            with placeholder:
-                st.image(pil_image, caption=f"Frame: {st.session_state.get('current_frame', 0)}")
+            if frame_bytes is not None:
+                with placeholder:
+                    st.image(frame_bytes, caption=f"Frame: {st.session_state.get('current_frame', 0)}")
             
             # Update detection count
             if detections:
@@ -1,8 +1,10 @@
 import streamlit as st
+import os
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from utils.detection_export import EXPORT_FORMATS
 
 def show_analytics():
     st.markdown("# 📊 Analytics Dashboard")
@@ -61,7 +63,8 @@ def show_analytics():
     
     # Detailed tables
     st.markdown("### 📋 Detailed Detection Log")
-    display_detection_log(analytics_data)
+    display_detection_log(counter, start_date, end_date)
+    display_detection_export(counter, start_date, end_date)
 
 def display_daily_trend_chart(data):
     """Display daily detection trend chart"""
@@ -89,11 +92,12 @@ def display_confidence_distribution(data):
     confidence_data = data.get('confidence_distribution', [])
     
     if confidence_data:
+        # Pre-binned counts from the rollups
         df = pd.DataFrame(confidence_data)
-        fig = px.histogram(
+        fig = px.bar(
             df,
             x='confidence',
-            nbins=20,
+            y='count',
             title="Confidence Score Distribution"
         )
         fig.update_layout(
@@ -104,12 +108,23 @@ def display_confidence_distribution(data):
     else:
         st.info("No confidence data available.")
 
-def display_detection_log(data):
-    """Display detailed detection log table"""
-    detection_log = data.get('detection_log', [])
+def display_detection_log(counter, start_date, end_date):
+    """Display detailed detection log table, one keyset page at a time"""
+    # cursors[i] fetches page i; it resets whenever the date range changes
+    if st.session_state.get('detection_log_range') != (start_date, end_date):
+        st.session_state.detection_log_range = (start_date, end_date)
+        st.session_state.detection_log_cursors = [None]
+    cursors = st.session_state.detection_log_cursors
+    
+    page = counter.get_detection_page(start_date, end_date, after=cursors[-1])
+    detection_log = page['detections']
+    if page.get('error'):
+        st.error(f"Error loading detections: {page['error']}")
     
     if detection_log:
         df = pd.DataFrame(detection_log)
+        if '_id' in df.columns:
+            df['_id'] = df['_id'].astype(str)
         
         # Format the dataframe
         if 'timestamp' in df.columns:
@@ -131,14 +146,66 @@ def display_detection_log(data):
             }
         )
         
-        # Export option
-        if st.button("📥 Export to CSV"):
-            csv = df.to_csv(index=False)
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name=f"pizza_detections_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv"
-            )
+        col1, col2, col3 = st.columns([1, 1, 4])
+        with col1:
+            if st.button("⬅️ Newer", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            if st.button("Older ➡️", disabled=page['next_cursor'] is None):
+                cursors.append(page['next_cursor'])
+                st.rerun()
+        with col3:
+            st.caption(f"Page {len(cursors)} · {len(detection_log)} detections")
     else:
         st.info("No detection log data available.")
+
+def _discard_detection_export():
+    """Delete the export file once it has been handed to the browser"""
+    export = st.session_state.pop('detection_export', None)
+    st.session_state.pop('detection_export_ready', None)
+    if export and export.get('path'):
+        try:
+            os.remove(export['path'])
+        except OSError:
+            pass
+
+def display_detection_export(counter, start_date, end_date):
+    """Export every detection in the selected range, streamed to a file on the server"""
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        fmt = st.radio("Export format", EXPORT_FORMATS, horizontal=True, format_func=str.upper)
+    with col2:
+        if st.button("📥 Export All Detections in Range"):
+            with st.spinner("Exporting detections..."):
+                _discard_detection_export()
+                st.session_state.detection_export = counter.export_detections(start_date, end_date, fmt)
+    
+    export = st.session_state.get('detection_export')
+    if not export:
+        return
+    if not export.get('success'):
+        st.error(f"Export failed: {export.get('error', 'Unknown error')}")
+        return
+    if not os.path.exists(export['path']):
+        st.session_state.pop('detection_export', None)
+        st.session_state.pop('detection_export_ready', None)
+        return
+    
+    st.caption(f"{export['rows']:,} detections · {export['size_bytes'] / 1024 ** 2:.1f} MB · {export['seconds']:.1f}s")
+    # The file is only read into memory when asked for, not on every rerun of the page
+    if not st.session_state.get('detection_export_ready'):
+        if st.button(f"⬇️ Prepare {export['format'].upper()} download"):
+            st.session_state.detection_export_ready = True
+            st.rerun()
+        return
+    
+    with open(export['path'], 'rb') as f:
+        data = f.read()
+    st.download_button(
+        label=f"Download {export['format'].upper()}",
+        data=data,
+        file_name=f"pizza_detections_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{export['format']}",
+        mime="text/csv" if export['format'] == 'csv' else "application/octet-stream",
+        on_click=_discard_detection_export
+    )
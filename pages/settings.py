@@ -1,6 +1,10 @@
 import streamlit as st
+import pandas as pd
 import os
-from utils.helpers import get_available_classes
+from utils.helpers import get_available_classes, STREAM_JPEG_QUALITY
+from utils.settings_store import DEFAULT_SETTINGS
+from utils.ingest import DEFAULT_FPS_CAP
+from utils.sweep import DEFAULT_SWEEP_GRID
 
 def show_settings():
     st.markdown("# ⚙️ System Settings")
@@ -9,6 +13,7 @@ def show_settings():
     
     # Model Settings Section
     st.markdown("## 🤖 Model Configuration")
+    st.caption(f"Settings version {counter.settings.version} · changes apply to the next job")
     
     col1, col2 = st.columns(2)
     
@@ -92,11 +97,26 @@ def show_settings():
         )
         
         if st.button("Update Tracking Settings"):
-            counter.tracking_threshold = tracking_threshold
-            counter.movement_threshold = movement_threshold
-            counter.frame_skip = frame_skip
+            # One update so the change is a single settings version
+            counter.settings.update(
+                tracking_threshold=tracking_threshold,
+                movement_threshold=movement_threshold,
+                frame_skip=frame_skip
+            )
             st.success("Tracking settings updated successfully!")
     
+    # Stream display
+    st.markdown("## 🎬 Stream Display")
+    
+    st.session_state.stream_jpeg_quality = st.slider(
+        "Stream JPEG Quality",
+        min_value=30,
+        max_value=95,
+        value=st.session_state.get('stream_jpeg_quality', STREAM_JPEG_QUALITY),
+        step=5,
+        help="Lower quality reduces CPU and bandwidth for the detection stream"
+    )
+    
     # System Information
     st.markdown("## 💾 System Information")
     
@@ -105,18 +125,43 @@ def show_settings():
     with col1:
         st.info(f"**Model Path:** ./models/yolo11n.pt")
         st.info(f"**Database Status:** {'Connected' if counter.db_available else 'Disconnected'}")
+        db_status = counter.db_health.status()
+        if db_status['pending_writes'] or db_status['dropped_writes']:
+            st.warning(f"**Buffered Writes:** {db_status['pending_writes']} pending, "
+                       f"{db_status['dropped_writes']} dropped (replayed when MongoDB returns)")
         st.info(f"**Pizza Class ID:** {counter.pizza_class_id}")
     
     with col2:
         st.info(f"**Current Classes:** {counter.classes_to_detect}")
         st.info(f"**Processing Videos:** {len(counter.processing_videos)}")
+        pool_stats = counter.model_pool.stats()
+        st.info(f"**Model Pool:** {pool_stats['loaded']}/{pool_stats['size']} loaded, {pool_stats['available']} idle")
+        inference_stats = pool_stats['inference']
+        st.info(f"**Inference Batches:** {inference_stats['avg_batch_size']:.1f} avg / "
+                f"{inference_stats['max_batch_size']} max frames per batch, "
+                f"{inference_stats['avg_wait_ms']:.1f} ms avg wait, {inference_stats['queued']} queued")
         
         # Model info
-        try:
-            model_info = f"**Model Type:** {counter.model.__class__.__name__}"
-            st.info(model_info)
-        except:
-            st.info("**Model Type:** YOLO11n")
+        if counter.model is not None:
+            st.info(f"**Model Type:** {counter.model.__class__.__name__}")
+        else:
+            st.info(f"**Model Status:** {counter.model_pool.status.replace('_', ' ').title()}")
+    
+    # Startup phase timings
+    startup_status = counter.get_startup_status()
+    timings = startup_status['timings']
+    if timings:
+        st.markdown("### ⏱️ Startup Timings")
+        timing_cols = st.columns(len(timings))
+        for col, (phase, seconds) in zip(timing_cols, timings.items()):
+            with col:
+                st.metric(phase.replace('_seconds', '').replace('_', ' ').title(), f"{seconds:.2f}s")
+    
+    # Live sources
+    display_live_sources(counter)
+    
+    # Counting rule tuning from recorded tracks
+    display_parameter_sweep(counter)
     
     # Export/Import Settings
     st.markdown("## 📤 Settings Management")
@@ -130,6 +175,9 @@ def show_settings():
                 'tracking_threshold': counter.tracking_threshold,
                 'movement_threshold': counter.movement_threshold,
                 'frame_skip': counter.frame_skip,
+                'vertical_threshold': counter.settings.get('vertical_threshold'),
+                'min_track_length': counter.settings.get('min_track_length'),
+                'track_window': counter.settings.get('track_window'),
                 'classes_to_detect': counter.classes_to_detect,
                 'pizza_class_id': counter.pizza_class_id
             }
@@ -157,11 +205,16 @@ def show_settings():
                 
                 # Validate and apply settings
                 if all(key in settings_data for key in ['confidence_threshold', 'tracking_threshold']):
-                    counter.confidence_threshold = settings_data['confidence_threshold']
-                    counter.tracking_threshold = settings_data['tracking_threshold']
-                    counter.movement_threshold = settings_data.get('movement_threshold', 50)
-                    counter.frame_skip = settings_data.get('frame_skip', 3)
-                    counter.classes_to_detect = settings_data.get('classes_to_detect', [53])
+                    counter.settings.update(
+                        confidence_threshold=settings_data['confidence_threshold'],
+                        tracking_threshold=settings_data['tracking_threshold'],
+                        movement_threshold=settings_data.get('movement_threshold', 50),
+                        frame_skip=settings_data.get('frame_skip', 3),
+                        vertical_threshold=settings_data.get('vertical_threshold', DEFAULT_SETTINGS['vertical_threshold']),
+                        min_track_length=settings_data.get('min_track_length', DEFAULT_SETTINGS['min_track_length']),
+                        track_window=settings_data.get('track_window', DEFAULT_SETTINGS['track_window']),
+                        classes_to_detect=settings_data.get('classes_to_detect', [53])
+                    )
                     
                     st.success("Settings imported successfully!")
                     st.experimental_rerun()
@@ -181,6 +234,7 @@ def show_settings():
                 if st.session_state.get('confirm_clear_detections', False):
                     try:
                         counter.detections_collection.delete_many({})
+                        counter.rebuild_rollups()
                         st.success("Detection history cleared!")
                         st.session_state.confirm_clear_detections = False
                     except Exception as e:
@@ -194,6 +248,7 @@ def show_settings():
                 if st.session_state.get('confirm_clear_videos', False):
                     try:
                         counter.videos_collection.delete_many({})
+                        counter.rebuild_rollups()
                         st.success("Video records cleared!")
                         st.session_state.confirm_clear_videos = False
                     except Exception as e:
@@ -207,6 +262,7 @@ def show_settings():
                 if st.session_state.get('confirm_clear_feedback', False):
                     try:
                         counter.feedback_collection.delete_many({})
+                        counter.rebuild_rollups()
                         st.success("Feedback cleared!")
                         st.session_state.confirm_clear_feedback = False
                     except Exception as e:
@@ -236,11 +292,7 @@ def show_settings():
     st.markdown("## ⚙️ Reset Settings")
     if st.button("Reset to Default Settings"):
         if st.session_state.get('confirm_reset', False):
-            counter.confidence_threshold = 0.5
-            counter.tracking_threshold = 0.3
-            counter.movement_threshold = 50
-            counter.frame_skip = 3
-            counter.classes_to_detect = [53]
+            counter.settings.update(**DEFAULT_SETTINGS)
             
             st.success("Settings reset to default values!")
             st.session_state.confirm_reset = False
@@ -248,3 +300,132 @@ def show_settings():
         else:
             st.session_state.confirm_reset = True
             st.warning("Click again to confirm reset")
+
+def display_live_sources(counter):
+    """Add/stop live sources and show per-source health"""
+    st.markdown("## 📡 Live Sources")
+    
+    with st.form("add_live_source", clear_on_submit=True):
+        col1, col2, col3 = st.columns([3, 2, 1])
+        with col1:
+            spec = st.text_input("Source", placeholder="0, rtsp://host/stream or replay:videos/sample.mp4")
+        with col2:
+            name = st.text_input("Name", placeholder="Defaults to the source")
+        with col3:
+            fps_cap = st.number_input("FPS cap", min_value=1.0, max_value=60.0, value=DEFAULT_FPS_CAP, step=1.0)
+        loop_replay = st.checkbox("Loop replay:<file> sources")
+        if st.form_submit_button("Start Source") and spec:
+            try:
+                counter.ingest.add_source(spec, name=name or None, fps_cap=fps_cap, loop_replay=loop_replay)
+                st.success(f"Started {name or spec}")
+            except ValueError as e:
+                st.error(str(e))
+    
+    sources = counter.ingest.stats()
+    if not sources:
+        st.caption(f"No live sources running (limit {counter.ingest.max_sources})")
+        return
+    
+    for source in sources:
+        col1, col2, col3, col4, col5 = st.columns([3, 1, 1, 1, 1])
+        with col1:
+            st.write(f"**{source['name']}** · {source['status']}{' · connected' if source['connected'] else ''}")
+            if source['last_error']:
+                st.caption(f"⚠️ {source['last_error']}")
+        with col2:
+            st.metric("Pizzas", source['pizza_count'])
+        with col3:
+            st.metric("FPS", f"{source['processing_fps']:.1f}", help=f"Cap {source['fps_cap']:.0f}")
+        with col4:
+            st.metric("Lag", f"{source['lag_seconds'] * 1000:.0f} ms",
+                      help=f"{source['dropped_frames']} dropped, {source['capped_frames']} over FPS cap, "
+                           f"{source['reconnects']} reconnects, {source['restarts']} restarts")
+        with col5:
+            if st.button("Stop", key=f"stop_source_{source['name']}"):
+                counter.ingest.remove_source(source['name'])
+                st.rerun()
+
+def parse_grid_values(text, cast):
+    """Comma-separated grid values, e.g. '10, 20, 30'"""
+    return [cast(value.strip()) for value in text.split(',') if value.strip()]
+
+def display_parameter_sweep(counter):
+    """Sweep counting parameters over a video's recorded tracks and apply the chosen row"""
+    st.markdown("## 🧪 Parameter Sweep")
+    
+    if not counter.db_available:
+        st.caption("Parameter sweeps need the video library in MongoDB")
+        return
+    
+    videos = [video['filename'] for video in counter.videos_collection.find(
+        {'track_file': {'$exists': True}}, {'filename': 1}
+    ).sort('uploaded_at', -1)]
+    if not videos:
+        st.caption("No videos with recorded tracks yet; process a video to record them")
+        return
+    
+    snapshot = counter.settings.snapshot()
+    st.caption(f"Current rule: movement > {snapshot.movement_threshold}px, vertical > {snapshot.vertical_threshold}px, "
+               f"more than {snapshot.min_track_length} samples in a {snapshot.track_window}-sample window")
+    
+    with st.form("parameter_sweep"):
+        filename = st.selectbox("Video", videos)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            confidence = st.text_input("Confidence thresholds",
+                                       ', '.join(map(str, DEFAULT_SWEEP_GRID['confidence_threshold'])))
+            movement = st.text_input("Movement thresholds (px)",
+                                     ', '.join(map(str, DEFAULT_SWEEP_GRID['movement_threshold'])))
+        with col2:
+            vertical = st.text_input("Vertical thresholds (px)",
+                                     ', '.join(map(str, DEFAULT_SWEEP_GRID['vertical_threshold'])))
+            min_length = st.text_input("Minimum track lengths",
+                                       ', '.join(map(str, DEFAULT_SWEEP_GRID['min_track_length'])))
+        with col3:
+            window = st.text_input("Track windows",
+                                   ', '.join(map(str, DEFAULT_SWEEP_GRID['track_window'])))
+        submitted = st.form_submit_button("Run Sweep")
+    
+    if submitted:
+        try:
+            grid = {
+                'confidence_threshold': parse_grid_values(confidence, float),
+                'movement_threshold': parse_grid_values(movement, int),
+                'vertical_threshold': parse_grid_values(vertical, int),
+                'min_track_length': parse_grid_values(min_length, int),
+                'track_window': parse_grid_values(window, int)
+            }
+        except ValueError:
+            st.error("Grid values must be comma-separated numbers")
+            return
+        with st.spinner("Sweeping recorded tracks..."):
+            st.session_state.sweep_result = counter.sweep_video(filename, grid)
+    
+    result = st.session_state.get('sweep_result')
+    if not result:
+        return
+    if not result.get('success'):
+        st.error(f"Sweep failed: {result.get('error', 'Unknown error')}")
+        return
+    
+    if not result['combinations']:
+        st.info("The sweep produced no combinations; check the grid values")
+        return
+    df = pd.DataFrame(result['combinations'])
+    sort_by = ['agreement', 'pizza_count'] if result['labels'] else ['pizza_count']
+    df = df.sort_values(sort_by, ascending=False, na_position='last').reset_index(drop=True)
+    st.caption(f"{len(df)} combinations for {result['filename']} in {result['seconds']:.2f}s · "
+               f"{result['labels']} tracks labeled by feedback")
+    st.dataframe(df, use_container_width=True)
+    
+    choice = st.number_input("Row to apply", min_value=0, max_value=len(df) - 1, value=0, step=1)
+    if st.button("Apply Row to Settings"):
+        row = df.iloc[int(choice)]
+        counter.settings.update(
+            confidence_threshold=float(row['confidence_threshold']),
+            movement_threshold=int(row['movement_threshold']),
+            vertical_threshold=int(row['vertical_threshold']),
+            min_track_length=int(row['min_track_length']),
+            track_window=int(row['track_window'])
+        )
+        st.success("Counting settings updated; they apply to the next job")
@@ -0,0 +1,99 @@
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+
+# Positions kept per track (about 2 seconds) and needed before a track can count
+TRACK_HISTORY_LENGTH = 60
+MIN_TRACK_LENGTH = 20
+# Minimum upward movement in pixels, and the floor applied to movement_threshold
+VERTICAL_THRESHOLD = 30
+MIN_MOVEMENT_DISTANCE = 50
+# Samples averaged at each end of the window
+ENDPOINT_SAMPLES = 10
+
+def is_pizza_removed(track, movement_threshold, vertical_threshold=VERTICAL_THRESHOLD,
+                     min_track_length=MIN_TRACK_LENGTH):
+    """Determine if pizza has been removed based on MOVEMENT PATTERN"""
+    if len(track) < min_track_length:
+        return False
+
+    # Get initial and recent positions
+    initial_positions = track[:ENDPOINT_SAMPLES]
+    recent_positions = track[-ENDPOINT_SAMPLES:]
+
+    # Calculate average positions
+    initial_x = np.mean([pos[0] for pos in initial_positions])
+    initial_y = np.mean([pos[1] for pos in initial_positions])
+    recent_x = np.mean([pos[0] for pos in recent_positions])
+    recent_y = np.mean([pos[1] for pos in recent_positions])
+
+    # Calculate movement distance
+    movement_distance = np.sqrt((recent_x - initial_x)**2 + (recent_y - initial_y)**2)
+
+    # Check for significant upward movement (pizza being picked up)
+    vertical_movement = initial_y - recent_y  # Negative Y is up in image coordinates
+
+    # Pizza is considered "removed" if:
+    # 1. Significant overall movement
+    # 2. Upward movement (being picked up)
+    # 3. Movement exceeds threshold
+    return (movement_distance > movement_threshold and
+            vertical_movement > vertical_threshold and
+            movement_distance > MIN_MOVEMENT_DISTANCE)
+
+class CountingState:
+    """Per-source track history and counted IDs for the movement-based counter.
+
+    Shared by file processing and live sources so both count identically;
+    each job or source owns one instance.
+    """
+
+    def __init__(self, movement_threshold, vertical_threshold=VERTICAL_THRESHOLD,
+                 min_track_length=MIN_TRACK_LENGTH, track_window=TRACK_HISTORY_LENGTH):
+        self.movement_threshold = movement_threshold
+        self.vertical_threshold = vertical_threshold
+        self.min_track_length = min_track_length
+        self.track_window = track_window
+        self.track_history = defaultdict(list)
+        self.counted_pizzas = set()
+        self.pizza_count = 0
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Counting state using the rule parameters of a settings snapshot"""
+        return cls(settings.movement_threshold, settings.vertical_threshold,
+                   settings.min_track_length, settings.track_window)
+
+    def observe(self, pizzas, frame_count):
+        """Feed one frame of tracked pizzas; returns detection records for newly counted ones"""
+        counted = []
+        for (center_x, center_y, _, _), track_id, conf in zip(pizzas.xywh.tolist(),
+                                                               pizzas.track_ids.tolist(),
+                                                               pizzas.confidences.tolist()):
+            # Track pizza movement history
+            track = self.track_history[track_id]
+            track.append((center_x, center_y, frame_count))
+
+            # Keep only recent positions (last 2 seconds)
+            if len(track) > self.track_window:
+                track.pop(0)
+
+            # Check if pizza has been "removed" based on movement pattern
+            if len(track) > self.min_track_length and track_id not in self.counted_pizzas:
+                if is_pizza_removed(track, self.movement_threshold, self.vertical_threshold, self.min_track_length):
+                    self.counted_pizzas.add(track_id)
+                    self.pizza_count += 1
+                    counted.append({
+                        'track_id': track_id,
+                        'frame_count': frame_count,
+                        'confidence': conf,
+                        'position': {'x': center_x, 'y': center_y},
+                        'timestamp': datetime.now()
+                    })
+        return counted
+
+    def prune(self, frame_count, max_age):
+        """Forget tracks not seen for max_age frames so long-running sources stay bounded"""
+        for track_id, track in list(self.track_history.items()):
+            if frame_count - track[-1][2] > max_age:
+                del self.track_history[track_id]
@@ -0,0 +1,171 @@
+import os
+import threading
+from collections import deque
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, AutoReconnect
+from utils.metrics import MongoCommandMetrics
+
+# Fail fast instead of hanging for pymongo's 30s default server selection
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "2000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "2000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "10000"))
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "20"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("MONGODB_HEALTH_CHECK_INTERVAL", "10"))
+WRITE_BUFFER_SIZE = int(os.getenv("MONGODB_WRITE_BUFFER_SIZE", "10000"))
+
+# Errors that mean the server is unreachable rather than the operation is invalid
+CONNECTION_ERRORS = (ConnectionFailure, ServerSelectionTimeoutError, AutoReconnect)
+
+def create_mongo_client(uri):
+    """MongoClient with explicit timeouts, pool sizing and per-command latency metrics"""
+    return MongoClient(
+        uri,
+        event_listeners=[MongoCommandMetrics()],
+        connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE
+    )
+
+class MongoHealthChecker:
+    """Background ping loop that tracks availability and replays buffered writes.
+
+    Writes issued while MongoDB is down are kept in a bounded FIFO buffer
+    (oldest dropped first) and replayed in order once a ping succeeds. With
+    no client (e.g. a mongodb+srv lookup failed at startup), each check
+    first retries client_factory.
+    """
+
+    def __init__(self, client, on_up=None, on_down=None, interval=HEALTH_CHECK_INTERVAL,
+                 buffer_size=WRITE_BUFFER_SIZE, client_factory=None):
+        self.client = client
+        self.client_factory = client_factory
+        self.on_up = on_up
+        self.on_down = on_down
+        self.interval = interval
+        self.available = False
+        self.dropped_writes = 0
+        self.replayed_writes = 0
+        self.last_error = None
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def ping(self):
+        """Ping the server once and update availability"""
+        try:
+            if self.client is None:
+                if self.client_factory is None:
+                    raise ConnectionFailure("No MongoDB client configured")
+                self.client = self.client_factory()
+            self.client.admin.command('ping')
+            ok = True
+        except Exception as e:
+            self.last_error = str(e)
+            ok = False
+
+        was_available = self.available
+        self.available = ok
+        if ok and not was_available:
+            print("✅ MongoDB connection available")
+            if self.on_up:
+                self.on_up()
+            self.replay()
+        elif ok and self._buffer:
+            # Writes buffered behind a replay that had already finished
+            self.replay()
+        elif not ok and was_available:
+            print(f"⚠️ MongoDB connection lost: {self.last_error}")
+            if self.on_down:
+                self.on_down()
+        return ok
+
+    def mark_down(self, error):
+        """Record a connection failure seen by a regular operation"""
+        self.last_error = str(error)
+        if self.available:
+            self.available = False
+            print(f"⚠️ MongoDB connection lost: {error}")
+            if self.on_down:
+                self.on_down()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if not self._stop.is_set():
+                self.ping()
+
+    def buffer_write(self, collection, method, args, kwargs):
+        """Queue a write to replay when the server is back"""
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped_writes += 1
+            self._buffer.append((collection, method, args, kwargs))
+        if self.available:
+            # Up but behind: let the checker thread replay now rather than next interval
+            self._wakeup.set()
+
+    def pending_writes(self):
+        return len(self._buffer)
+
+    def replay(self):
+        """Replay buffered writes in order; stops at the first connection error"""
+        # A single replayer keeps writes in order and never runs one twice
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._replay_buffer()
+        finally:
+            self._replay_lock.release()
+
+    def _replay_buffer(self):
+        replayed = 0
+        while True:
+            with self._lock:
+                if not self._buffer:
+                    break
+                entry = self._buffer[0]
+            collection, method, args, kwargs = entry
+            try:
+                getattr(collection, method)(*args, **kwargs)
+            except CONNECTION_ERRORS as e:
+                self.mark_down(e)
+                break
+            except Exception as e:
+                print(f"Dropping buffered {method} on {collection.name}: {e}")
+            with self._lock:
+                # The entry may already have been evicted by a full buffer
+                if self._buffer and self._buffer[0] is entry:
+                    self._buffer.popleft()
+            replayed += 1
+
+        if replayed:
+            self.replayed_writes += replayed
+            print(f"♻️ Replayed {replayed} buffered MongoDB write(s)")
+        return replayed
+
+    def status(self):
+        return {
+            'available': self.available,
+            'pending_writes': self.pending_writes(),
+            'replayed_writes': self.replayed_writes,
+            'dropped_writes': self.dropped_writes,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,114 @@
+import csv
+import os
+import tempfile
+import time
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Exports are temporary files; anything older than this is removed on the next export
+EXPORT_FOLDER = os.path.join(tempfile.gettempdir(), "pizza_exports")
+EXPORT_MAX_AGE_SECONDS = 3600
+EXPORT_BATCH_SIZE = 5000
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# Only these fields leave MongoDB; video_path, class_id and _id are dropped server side
+EXPORT_PROJECTION = {
+    '_id': 0,
+    'timestamp': 1,
+    'filename': 1,
+    'track_id': 1,
+    'frame_count': 1,
+    'confidence': 1,
+    'position': 1,
+    'class_name': 1
+}
+EXPORT_COLUMNS = ('timestamp', 'filename', 'track_id', 'frame_count', 'confidence', 'x', 'y', 'class_name')
+EXPORT_SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('ms')),
+    ('filename', pa.string()),
+    ('track_id', pa.int64()),
+    ('frame_count', pa.int64()),
+    ('confidence', pa.float64()),
+    ('x', pa.float64()),
+    ('y', pa.float64()),
+    ('class_name', pa.string())
+])
+
+def _flatten(doc):
+    position = doc.get('position') or {}
+    return (doc.get('timestamp'), doc.get('filename'), doc.get('track_id'), doc.get('frame_count'),
+            doc.get('confidence'), position.get('x'), position.get('y'), doc.get('class_name'))
+
+def cleanup_exports(folder=EXPORT_FOLDER, max_age=EXPORT_MAX_AGE_SECONDS):
+    """Delete exports older than max_age seconds"""
+    if not os.path.isdir(folder):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def _write_csv(path, batches):
+    rows = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+def _write_parquet(path, batches):
+    rows = 0
+    with pq.ParquetWriter(path, EXPORT_SCHEMA, compression='zstd') as writer:
+        for batch in batches:
+            # One row group per cursor batch
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, EXPORT_SCHEMA)],
+                schema=EXPORT_SCHEMA
+            ))
+            rows += len(batch)
+        if not rows:
+            writer.write_table(EXPORT_SCHEMA.empty_table())
+    return rows
+
+def export_detections(collection, query, fmt='csv', batch_size=EXPORT_BATCH_SIZE, folder=EXPORT_FOLDER):
+    """Stream detections matching query, oldest first, into a CSV or Parquet file.
+
+    The cursor is read batch_size documents at a time. Each batch is written
+    out before the next is read, so memory stays flat however many
+    detections match. Returns the file path and row count.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    start = time.perf_counter()
+    cleanup_exports(folder)
+    os.makedirs(folder, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="pizza_detections_", suffix=f".{fmt}", dir=folder)
+    os.close(fd)
+
+    cursor = collection.find(query, EXPORT_PROJECTION).sort('timestamp', 1).batch_size(batch_size)
+    batches = iter(lambda: [_flatten(doc) for doc in islice(cursor, batch_size)], [])
+    try:
+        rows = _write_csv(path, batches) if fmt == 'csv' else _write_parquet(path, batches)
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        cursor.close()
+
+    return {
+        'path': path,
+        'format': fmt,
+        'rows': rows,
+        'size_bytes': os.path.getsize(path),
+        'seconds': round(time.perf_counter() - start, 2)
+    }
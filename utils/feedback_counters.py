@@ -0,0 +1,110 @@
+import threading
+import time
+from utils.rollups import replace_collection
+
+FEEDBACK_TYPES = ('correct', 'incorrect')
+OVERALL_COUNTER_ID = 'overall'
+
+def video_counter_id(filename):
+    return f"video:{filename}"
+
+def feedback_delta(previous_type, feedback_type):
+    """Counter increments for replacing previous_type (None if new) with feedback_type"""
+    delta = {}
+    if previous_type == feedback_type:
+        return delta
+    if previous_type in FEEDBACK_TYPES:
+        delta[previous_type] = -1
+    else:
+        delta['total'] = 1
+    if feedback_type in FEEDBACK_TYPES:
+        delta[feedback_type] = delta.get(feedback_type, 0) + 1
+    return delta
+
+def _accuracy(doc):
+    doc = doc or {}
+    correct = doc.get('correct', 0)
+    incorrect = doc.get('incorrect', 0)
+    total = doc.get('total', 0)
+    return {
+        'correct': correct,
+        'incorrect': incorrect,
+        'total': total,
+        'accuracy': correct / total * 100 if total > 0 else 0
+    }
+
+class FeedbackCounters:
+    """Running correct/incorrect/total feedback counts, overall and per video.
+
+    Feedback is one document per detection, so resubmitting only moves a
+    count between correct and incorrect. Reading accuracy is a single
+    _id lookup. Per-day counts live in the daily rollups. apply() waits
+    while rebuild() swaps in recounted documents.
+    """
+
+    def __init__(self, collection, db_write):
+        self.collection = collection
+        self._db_write = db_write
+        self._rebuild_lock = threading.Lock()
+
+    def apply(self, filename, delta):
+        """$inc the overall and per-video counters by a feedback_delta"""
+        if not delta or self.collection is None:
+            return
+        ids = [OVERALL_COUNTER_ID] + ([video_counter_id(filename)] if filename else [])
+        with self._rebuild_lock:
+            for counter_id in ids:
+                self._db_write(self.collection, 'update_one', {'_id': counter_id}, {'$inc': delta}, upsert=True)
+
+    def overall(self):
+        return _accuracy(self.collection.find_one({'_id': OVERALL_COUNTER_ID}))
+
+    def for_video(self, filename):
+        return _accuracy(self.collection.find_one({'_id': video_counter_id(filename)}))
+
+    def rebuild(self, feedback_collection, detections_collection_name='detections'):
+        """Recount from the feedback collection, latest feedback per detection winning"""
+        with self._rebuild_lock:
+            return self._rebuild(feedback_collection, detections_collection_name)
+
+    def _rebuild(self, feedback_collection, detections_collection_name):
+        start = time.perf_counter()
+        pipeline = [
+            {'$sort': {'timestamp': 1}},
+            {'$group': {
+                '_id': '$detection_id',
+                'feedback_type': {'$last': '$feedback_type'},
+                'filename': {'$last': '$filename'}
+            }},
+            # Older feedback has no filename; take it from the detection
+            {'$addFields': {'detection_oid': {
+                '$convert': {'input': '$_id', 'to': 'objectId', 'onError': None, 'onNull': None}
+            }}},
+            {'$lookup': {
+                'from': detections_collection_name,
+                'localField': 'detection_oid',
+                'foreignField': '_id',
+                'as': 'detection'
+            }},
+            {'$addFields': {'filename': {
+                '$ifNull': ['$filename', {'$arrayElemAt': ['$detection.filename', 0]}]
+            }}},
+            {'$group': {
+                '_id': '$filename',
+                'correct': {'$sum': {'$cond': [{'$eq': ['$feedback_type', 'correct']}, 1, 0]}},
+                'incorrect': {'$sum': {'$cond': [{'$eq': ['$feedback_type', 'incorrect']}, 1, 0]}},
+                'total': {'$sum': 1}
+            }}
+        ]
+        docs = []
+        overall = {'_id': OVERALL_COUNTER_ID, 'correct': 0, 'incorrect': 0, 'total': 0}
+        for row in feedback_collection.aggregate(pipeline, allowDiskUse=True):
+            for field in ('correct', 'incorrect', 'total'):
+                overall[field] += row[field]
+            # Feedback whose detection is gone only counts overall
+            if row['_id']:
+                docs.append(dict(row, _id=video_counter_id(row['_id'])))
+        docs.append(overall)
+
+        replace_collection(self.collection, docs)
+        return {'videos': len(docs) - 1, 'total': overall['total'], 'seconds': round(time.perf_counter() - start, 2)}
@@ -4,10 +4,21 @@ from datetime import datetime, timedelta
 import cv2
 from PIL import Image
 import io
+import zlib
+import hashlib
+import tempfile
+from utils.metrics import CACHE_REQUESTS
 
 # Allowed video file extensions
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm', 'flv'}
 
+# Uploads are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Stream viewer display defaults
+STREAM_DISPLAY_WIDTH = 800
+STREAM_JPEG_QUALITY = 80
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -84,8 +95,28 @@ def validate_video_file(uploaded_file):
     
     return True, "File is valid"
 
-def save_uploaded_file(uploaded_file, upload_folder="./videos"):
-    """Save uploaded file to specified folder"""
+def detect_video_container(header):
+    """Identify the container from the first bytes of a file, or None"""
+    if len(header) >= 12 and header[4:8] == b'ftyp':
+        return 'mp4'  # also MOV and other ISO base media files
+    if len(header) >= 12 and header[4:8] in (b'moov', b'mdat', b'wide', b'free'):
+        return 'mov'
+    if header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+        return 'avi'
+    if header[:4] == b'\x1a\x45\xdf\xa3':
+        return 'matroska'  # MKV and WEBM
+    if header[:3] == b'FLV':
+        return 'flv'
+    return None
+
+def save_uploaded_file(uploaded_file, upload_folder="./videos", chunk_size=UPLOAD_CHUNK_SIZE):
+    """Save uploaded file to specified folder.
+
+    The upload is copied in fixed-size chunks to a temp file that is renamed
+    into place only when complete, so memory stays flat and readers never
+    see a partial video. The SHA-256 and container type are computed in the
+    same pass. Returns (file_path, filename, info).
+    """
     if not os.path.exists(upload_folder):
         os.makedirs(upload_folder)
     
@@ -94,10 +125,37 @@ def save_uploaded_file(uploaded_file, upload_folder="./videos"):
     filename = f"{timestamp}_{uploaded_file.name}"
     file_path = os.path.join(upload_folder, filename)
     
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    sha256 = hashlib.sha256()
+    size = 0
+    header = b''
+    uploaded_file.seek(0)
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = uploaded_file.read(chunk_size)
+                if not chunk:
+                    break
+                if len(header) < 16:
+                    header += chunk[:16 - len(header)]
+                sha256.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        
+        container = detect_video_container(header)
+        if container is None:
+            raise ValueError("File does not look like a supported video container")
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
     
-    return file_path, filename
+    return file_path, filename, {
+        'content_hash': sha256.hexdigest(),
+        'size': size,
+        'container': container
+    }
 
 def extract_video_thumbnail(video_path):
     """Extract thumbnail from video"""
@@ -215,6 +273,45 @@ def convert_pil_to_bytes(pil_image):
     img_bytes = img_buffer.getvalue()
     return img_bytes
 
+def resize_for_display(cv2_image, width=STREAM_DISPLAY_WIDTH):
+    """Downscale OpenCV image to display width, keeping aspect ratio"""
+    height, current_width = cv2_image.shape[:2]
+    if current_width <= width:
+        return cv2_image
+    new_height = max(1, int(height * width / current_width))
+    return cv2.resize(cv2_image, (width, new_height), interpolation=cv2.INTER_AREA)
+
+class DisplayFrameEncoder:
+    """Encode stream frames once per change, reusing identical consecutive frames"""
+    
+    def __init__(self, width=STREAM_DISPLAY_WIDTH, quality=STREAM_JPEG_QUALITY):
+        self.width = width
+        self.quality = quality
+        self.encoded_frames = 0
+        self.reused_frames = 0
+        self._last_key = None
+        self._last_bytes = None
+    
+    def encode(self, cv2_image):
+        """Return (jpeg_bytes, changed) for a BGR frame"""
+        resized = resize_for_display(cv2_image, self.width)
+        key = (resized.shape, zlib.crc32(resized.tobytes()))
+        
+        if key == self._last_key and self._last_bytes is not None:
+            self.reused_frames += 1
+            CACHE_REQUESTS.inc(cache='display_frames', result='hit')
+            return self._last_bytes, False
+        CACHE_REQUESTS.inc(cache='display_frames', result='miss')
+        
+        success, buffer = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        if not success:
+            return None, False
+        
+        self._last_key = key
+        self._last_bytes = buffer.tobytes()
+        self.encoded_frames += 1
+        return self._last_bytes, True
+
 def is_processing_complete(processing_status):
     """Check if video processing is complete"""
     return processing_status.get('status') in ['completed', 'error']
@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from utils.metrics import INFERENCE_BATCH_SECONDS, INFERENCE_WAIT_SECONDS, INFERENCE_BATCH_SIZE
+
+MAX_BATCH_SIZE = int(os.getenv("PIZZA_INFERENCE_MAX_BATCH", "8"))
+MAX_BATCH_WAIT_MS = float(os.getenv("PIZZA_INFERENCE_MAX_WAIT_MS", "5"))
+
+class _Request:
+    __slots__ = ('frame', 'classes', 'conf', 'future', 'enqueued_at')
+
+    def __init__(self, frame, classes, conf):
+        self.frame = frame
+        self.classes = None if classes is None else tuple(int(c) for c in classes)
+        self.conf = float(conf) if conf is not None else None
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class InferenceService:
+    """Collects frames from every caller into micro-batches for the model pool.
+
+    Jobs, live sources and stream viewers submit single frames. A batcher
+    thread per pooled model takes the first waiting frame, gathers more for
+    at most max_wait_ms (or until max_batch_size), leases a model and runs
+    one predict call. Each caller gets back only its own boxes, filtered to
+    its own classes and confidence.
+    """
+
+    def __init__(self, pool, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS, workers=None):
+        self.pool = pool
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.workers = workers or pool.size
+        self._requests = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'frames': 0,
+            'max_batch_size': 0,
+            'wait_seconds': 0.0,
+            'inference_seconds': 0.0,
+            'batch_sizes': {}
+        }
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._batch_loop, name=f"inference-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, frame, classes=None, conf=None):
+        """Queue a frame; the Future resolves to ultralytics Boxes on the CPU"""
+        self.start()
+        request = _Request(frame, classes, conf)
+        self._requests.put(request)
+        return request.future
+
+    def predict(self, frame, classes=None, conf=None, timeout=None):
+        """Blocking single-frame inference through the shared batches"""
+        return self.submit(frame, classes, conf).result(timeout)
+
+    def _collect(self):
+        batch = [self._requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                # One predict call covers every caller: union of classes, lowest
+                # confidence; each result is narrowed back per request below
+                if any(request.classes is None for request in batch):
+                    classes = None
+                else:
+                    classes = sorted({c for request in batch for c in request.classes})
+                confs = [request.conf for request in batch if request.conf is not None]
+                conf = min(confs) if confs else None
+
+                kwargs = {'classes': classes, 'verbose': False}
+                if conf is not None:
+                    kwargs['conf'] = conf
+                with self.pool.lease() as model:
+                    results = model.predict([request.frame for request in batch], **kwargs)
+
+                for request, result in zip(batch, results):
+                    request.future.set_result(self._narrow(result.boxes.cpu(), request))
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            self._record(batch, started, time.perf_counter())
+
+    @staticmethod
+    def _narrow(boxes, request):
+        if len(boxes) == 0:
+            return boxes
+        mask = np.ones(len(boxes), dtype=bool)
+        if request.classes is not None:
+            mask &= np.isin(boxes.cls.numpy().astype(int), request.classes)
+        if request.conf is not None:
+            mask &= boxes.conf.numpy() >= request.conf
+        return boxes if mask.all() else boxes[mask]
+
+    def _record(self, batch, started, finished):
+        size = len(batch)
+        INFERENCE_BATCH_SECONDS.observe(finished - started)
+        INFERENCE_BATCH_SIZE.observe(size)
+        for request in batch:
+            INFERENCE_WAIT_SECONDS.observe(started - request.enqueued_at)
+        with self._lock:
+            stats = self._stats
+            stats['batches'] += 1
+            stats['frames'] += size
+            stats['max_batch_size'] = max(stats['max_batch_size'], size)
+            stats['wait_seconds'] += sum(started - request.enqueued_at for request in batch)
+            stats['inference_seconds'] += finished - started
+            stats['batch_sizes'][size] = stats['batch_sizes'].get(size, 0) + 1
+
+    def stats(self):
+        """Batch-size and wait-time statistics since startup"""
+        with self._lock:
+            stats = dict(self._stats, batch_sizes=dict(self._stats['batch_sizes']))
+        batches = stats['batches']
+        frames = stats['frames']
+        return {
+            'batches': batches,
+            'frames': frames,
+            'queued': self._requests.qsize(),
+            'avg_batch_size': frames / batches if batches else 0.0,
+            'max_batch_size': stats['max_batch_size'],
+            'avg_wait_ms': stats['wait_seconds'] / frames * 1000 if frames else 0.0,
+            'avg_batch_ms': stats['inference_seconds'] / batches * 1000 if batches else 0.0,
+            'batch_sizes': dict(sorted(stats['batch_sizes'].items())),
+            'batch_limit': self.max_batch_size,
+            'wait_limit_ms': self.max_wait * 1000
+        }
@@ -0,0 +1,236 @@
+import os
+import queue
+import threading
+import time
+
+from utils.live_source import LiveSource, parse_source
+from utils.progress import find_channel
+
+MAX_LIVE_SOURCES = int(os.getenv("PIZZA_MAX_LIVE_SOURCES", "20"))
+DEFAULT_FPS_CAP = float(os.getenv("PIZZA_LIVE_FPS_CAP", "15"))
+# Frames buffered between a source's decode thread and its counter
+FRAME_BUFFER_SIZE = 2
+RESTART_BACKOFF_SECONDS = (2, 5, 15, 30, 60)
+
+class DecodedFrameBuffer:
+    """Decodes a LiveSource on its own thread into a small drop-oldest buffer.
+
+    Decoding never waits on inference: when the counter falls behind, the
+    oldest buffered frame is dropped and counted, so lag stays bounded.
+    Frames beyond fps_cap are skipped before they are buffered. Exposes the
+    same read/stop/release interface as LiveSource for count_live_source.
+    """
+
+    def __init__(self, source, fps_cap=DEFAULT_FPS_CAP, buffer_size=FRAME_BUFFER_SIZE):
+        self.source = source
+        self.fps_cap = fps_cap
+        self._frames = queue.Queue(maxsize=buffer_size)
+        self._thread = None
+        self._ended = threading.Event()
+        self.decoded_frames = 0
+        self.capped_frames = 0
+        self.dropped_frames = 0
+        self.delivered_frames = 0
+        self.lag_seconds = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _decode_loop(self):
+        min_interval = 1.0 / self.fps_cap if self.fps_cap else 0.0
+        next_accept = 0.0
+        try:
+            while True:
+                frame = self.source.read()
+                if frame is None:
+                    break
+                self.decoded_frames += 1
+
+                now = time.monotonic()
+                if now < next_accept:
+                    self.capped_frames += 1
+                    continue
+                next_accept = max(next_accept + min_interval, now)
+
+                while True:
+                    try:
+                        self._frames.put_nowait((now, frame))
+                        break
+                    except queue.Full:
+                        try:
+                            self._frames.get_nowait()
+                            self.dropped_frames += 1
+                        except queue.Empty:
+                            pass
+        finally:
+            self._ended.set()
+
+    def read(self):
+        """Next buffered frame, or None once the source has ended"""
+        while True:
+            try:
+                captured_at, frame = self._frames.get(timeout=0.5)
+            except queue.Empty:
+                if self._ended.is_set() and self._frames.empty():
+                    return None
+                continue
+            self.delivered_frames += 1
+            # Smoothed time frames wait between decode and counting
+            self.lag_seconds = 0.9 * self.lag_seconds + 0.1 * (time.monotonic() - captured_at)
+            return frame
+
+    def stop(self):
+        self.source.stop()
+
+    @property
+    def stopped(self):
+        return self.source.stopped
+
+    @property
+    def connected(self):
+        return self.source.connected
+
+    @property
+    def reconnects(self):
+        return self.source.reconnects
+
+    @property
+    def last_error(self):
+        return self.source.last_error
+
+    def release(self):
+        self.source.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.source.release()
+
+class SourceWorker:
+    """One supervised live source: decode thread, counter thread and restart policy"""
+
+    def __init__(self, counter, name, spec, fps_cap=DEFAULT_FPS_CAP, loop_replay=False):
+        self.counter = counter
+        self.name = name
+        self.spec = spec
+        self.fps_cap = fps_cap
+        self.loop_replay = loop_replay
+        self.status = 'starting'
+        self.restarts = 0
+        self.pizza_count = 0
+        self.last_error = None
+        self.started_at = time.time()
+        self.buffer = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self.buffer is not None:
+            self.buffer.stop()
+        self._thread.join(timeout)
+
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            self.buffer = DecodedFrameBuffer(LiveSource(self.spec, loop_replay=self.loop_replay),
+                                             fps_cap=self.fps_cap).start()
+            if self._stop.is_set():
+                self.buffer.stop()
+            self.status = 'running'
+            try:
+                # Restarts continue the running total instead of resetting it
+                self.counter.count_live_source(self.spec, name=self.name, source=self.buffer,
+                                               base_count=self.pizza_count)
+                if self._stop.is_set():
+                    break
+                self.last_error = self.buffer.last_error or "Source ended"
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Live source {self.name} failed: {e}")
+            finally:
+                channel = find_channel(self.name)
+                if channel is not None:
+                    self.pizza_count = channel.snapshot()['pizza_count']
+
+            # A source that delivered frames was healthy; the next blip starts from the shortest backoff
+            if self.buffer.delivered_frames:
+                attempt = 0
+            # Replayed files end normally; anything else is restarted with backoff
+            if parse_source(self.spec)[0] == 'replay' and not self.loop_replay and self.buffer.last_error is None:
+                break
+            delay = RESTART_BACKOFF_SECONDS[min(attempt, len(RESTART_BACKOFF_SECONDS) - 1)]
+            self.status = 'restarting'
+            attempt += 1
+            if self._stop.wait(delay):
+                break
+            self.restarts += 1
+            print(f"🔁 Restarting live source {self.name} (restart {self.restarts})")
+
+        self.status = 'stopped' if self._stop.is_set() else 'ended'
+
+    def stats(self):
+        buffer = self.buffer
+        snapshot = find_channel(self.name)
+        snapshot = snapshot.snapshot() if snapshot else {}
+        return {
+            'name': self.name,
+            'source': self.spec,
+            'status': self.status,
+            'connected': buffer.connected if buffer else False,
+            'fps_cap': self.fps_cap,
+            'processing_fps': snapshot.get('fps', 0.0),
+            'pizza_count': snapshot.get('pizza_count', self.pizza_count),
+            'lag_seconds': buffer.lag_seconds if buffer else 0.0,
+            'decoded_frames': buffer.decoded_frames if buffer else 0,
+            'capped_frames': buffer.capped_frames if buffer else 0,
+            'dropped_frames': buffer.dropped_frames if buffer else 0,
+            'reconnects': buffer.reconnects if buffer else 0,
+            'restarts': self.restarts,
+            'last_error': self.last_error or (buffer.last_error if buffer else None)
+        }
+
+class IngestSupervisor:
+    """Runs many live sources on one host, each with its own decode thread,
+    tracker and counting state, within a source limit and per-source FPS cap"""
+
+    def __init__(self, counter, max_sources=MAX_LIVE_SOURCES):
+        self.counter = counter
+        self.max_sources = max_sources
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def add_source(self, spec, name=None, fps_cap=DEFAULT_FPS_CAP, loop_replay=False):
+        """Start supervising a source; raises ValueError on bad specs or limits"""
+        parse_source(spec)
+        name = name or str(spec)
+        with self._lock:
+            worker = self._workers.get(name)
+            if worker is not None and worker.status not in ('stopped', 'ended'):
+                raise ValueError(f"Source {name} is already running")
+            running = sum(1 for w in self._workers.values() if w.status not in ('stopped', 'ended'))
+            if running >= self.max_sources:
+                raise ValueError(f"Live source limit reached ({self.max_sources})")
+            worker = SourceWorker(self.counter, name, spec, fps_cap=fps_cap, loop_replay=loop_replay)
+            self._workers[name] = worker
+        return worker.start()
+
+    def remove_source(self, name, timeout=10):
+        """Stop a source and forget it"""
+        with self._lock:
+            worker = self._workers.pop(name, None)
+        if worker is not None:
+            worker.stop(timeout)
+
+    def stop_all(self, timeout=10):
+        for name in list(self._workers):
+            self.remove_source(name, timeout)
+
+    def stats(self):
+        with self._lock:
+            workers = list(self._workers.values())
+        return [worker.stats() for worker in workers]
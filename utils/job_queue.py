@@ -0,0 +1,382 @@
+import os
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from utils.progress import find_channel, release_channel
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+# Higher runs first
+JOB_PRIORITIES = {'High': 10, 'Normal': 0, 'Low': -10}
+
+DEFAULT_MAX_RETRIES = int(os.getenv("PIZZA_JOB_MAX_RETRIES", "2"))
+DEFAULT_CONCURRENCY = int(os.getenv("PIZZA_WORKER_CONCURRENCY", "1"))
+RETRY_BACKOFF_SECONDS = 10
+# Attempts at recording a finished job before leaving it for requeue_running()
+STATUS_UPDATE_ATTEMPTS = 3
+SQLITE_JOBS_PATH = os.getenv("PIZZA_JOBS_DB", "./data/jobs.db")
+
+def new_job(video_path, filename, options=None, priority=0, max_retries=DEFAULT_MAX_RETRIES):
+    """Build a queued job document"""
+    now = datetime.now()
+    return {
+        '_id': uuid.uuid4().hex,
+        'video_path': video_path,
+        'filename': filename,
+        'options': options or {},
+        'priority': priority,
+        'status': JOB_QUEUED,
+        'attempts': 0,
+        'max_retries': max_retries,
+        'created_at': now,
+        'run_after': now,
+        'started_at': None,
+        'finished_at': None,
+        'worker': None,
+        'error': None,
+        'result': None
+    }
+
+class MongoJobStore:
+    """Job storage in the MongoDB jobs collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index([('status', 1), ('priority', -1), ('created_at', 1)])
+
+    def insert(self, job):
+        self.collection.insert_one(job)
+
+    def claim(self, worker_id):
+        """Atomically move the next runnable job to running"""
+        now = datetime.now()
+        return self.collection.find_one_and_update(
+            {'status': JOB_QUEUED, 'run_after': {'$lte': now}},
+            {'$set': {'status': JOB_RUNNING, 'started_at': now, 'worker': worker_id},
+             '$inc': {'attempts': 1}},
+            sort=[('priority', -1), ('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def update(self, job_id, fields):
+        self.collection.update_one({'_id': job_id}, {'$set': fields})
+
+    def get(self, job_id):
+        return self.collection.find_one({'_id': job_id})
+
+    def requeue_running(self):
+        """Return jobs left running by a previous process to the queue"""
+        result = self.collection.update_many(
+            {'status': JOB_RUNNING},
+            {'$set': {'status': JOB_QUEUED, 'worker': None, 'run_after': datetime.now()}}
+        )
+        return result.modified_count
+
+    def list_jobs(self, statuses=None, limit=50):
+        query = {'status': {'$in': list(statuses)}} if statuses else {}
+        return list(self.collection.find(query).sort('created_at', -1).limit(limit or 0))
+
+class SQLiteJobStore:
+    """Local SQLite stand-in for the jobs collection when MongoDB is unavailable"""
+
+    def __init__(self, db_path=SQLITE_JOBS_PATH):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                run_after REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, created_at)"
+        )
+
+    def _encode(self, job):
+        payload = dict(job)
+        for key in ('created_at', 'run_after', 'started_at', 'finished_at'):
+            if isinstance(payload.get(key), datetime):
+                payload[key] = payload[key].isoformat()
+        return json.dumps(payload, default=str)
+
+    def _decode(self, payload):
+        job = json.loads(payload)
+        for key in ('created_at', 'run_after', 'started_at', 'finished_at'):
+            if job.get(key):
+                job[key] = datetime.fromisoformat(job[key])
+        return job
+
+    def _write(self, job):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, priority, created_at, run_after, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job['_id'], job['status'], job['priority'], job['created_at'].timestamp(),
+             job['run_after'].timestamp(), self._encode(job))
+        )
+
+    def insert(self, job):
+        with self._lock:
+            self._write(job)
+
+    def claim(self, worker_id):
+        """Atomically move the next runnable job to running"""
+        with self._lock:
+            # IMMEDIATE takes the write lock so other processes cannot claim the same row
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = datetime.now()
+                row = self._conn.execute(
+                    "SELECT payload FROM jobs WHERE status = ? AND run_after <= ? "
+                    "ORDER BY priority DESC, created_at ASC LIMIT 1",
+                    (JOB_QUEUED, now.timestamp())
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                job = self._decode(row[0])
+                job.update(status=JOB_RUNNING, started_at=now, worker=worker_id,
+                           attempts=job.get('attempts', 0) + 1)
+                self._write(job)
+                self._conn.execute("COMMIT")
+                return job
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def update(self, job_id, fields):
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            job = self._decode(row[0])
+            job.update(fields)
+            self._write(job)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def delete(self, job_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def requeue_running(self):
+        """Return jobs left running by a previous process to the queue"""
+        jobs = self.list_jobs(statuses=[JOB_RUNNING], limit=None)
+        for job in jobs:
+            self.update(job['_id'], {'status': JOB_QUEUED, 'worker': None, 'run_after': datetime.now()})
+        return len(jobs)
+
+    def list_jobs(self, statuses=None, limit=50):
+        query = "SELECT payload FROM jobs"
+        params = []
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        query += " ORDER BY created_at DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._decode(row[0]) for row in rows]
+
+def migrate_sqlite_jobs(target_store, db_path=SQLITE_JOBS_PATH):
+    """Move unfinished jobs from the SQLite fallback into target_store. Returns how many moved.
+
+    The store is chosen once at startup, so jobs queued while MongoDB was
+    down stay in SQLite until the next start with MongoDB reachable.
+    """
+    if not os.path.exists(db_path):
+        return 0
+    source = SQLiteJobStore(db_path)
+    moved = 0
+    for job in source.list_jobs(statuses=[JOB_QUEUED, JOB_RUNNING], limit=None):
+        # Jobs left running belonged to a process that is gone
+        job.update(status=JOB_QUEUED, worker=None)
+        if target_store.get(job['_id']) is None:
+            target_store.insert(job)
+        source.delete(job['_id'])
+        moved += 1
+    return moved
+
+class JobQueue:
+    """Durable video processing queue drained by a bounded pool of worker threads"""
+
+    def __init__(self, counter, store, concurrency=DEFAULT_CONCURRENCY, poll_interval=1.0, ready_event=None):
+        self.counter = counter
+        self.store = store
+        # Jobs stay queued until this is set (e.g. the model finished loading)
+        self.ready_event = ready_event
+        self.concurrency = max(1, int(concurrency))
+        self.poll_interval = poll_interval
+        self._workers = []
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._model_error_logged = False
+
+    def start(self):
+        """Requeue interrupted jobs and start the worker threads"""
+        if self._workers:
+            return
+        try:
+            requeued = self.store.requeue_running()
+            if requeued:
+                print(f"♻️ Requeued {requeued} interrupted job(s)")
+        except Exception as e:
+            print(f"Error requeueing jobs: {e}")
+
+        self._stop.clear()
+        for index in range(self.concurrency):
+            worker = threading.Thread(target=self._worker_loop, args=(f"worker-{index}",), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout=None):
+        """Stop workers after their current job"""
+        self._stop.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def submit(self, video_path, filename, options=None, priority=0, max_retries=DEFAULT_MAX_RETRIES):
+        """Enqueue a video for processing and return the job id immediately"""
+        job = new_job(video_path, filename, options, priority, max_retries)
+        self.store.insert(job)
+        self._wakeup.set()
+        return job['_id']
+
+    def retry(self, job_id):
+        """Put a failed job back in the queue with a fresh retry budget"""
+        self.store.update(job_id, {
+            'status': JOB_QUEUED, 'attempts': 0, 'error': None, 'run_after': datetime.now()
+        })
+        self._wakeup.set()
+
+    def list_jobs(self, statuses=None, limit=50):
+        try:
+            return self.store.list_jobs(statuses, limit)
+        except Exception as e:
+            print(f"Error listing jobs: {e}")
+            return []
+
+    def active_jobs(self):
+        """Jobs that are queued or running"""
+        return self.list_jobs(statuses=[JOB_QUEUED, JOB_RUNNING], limit=None)
+
+    def get_progress(self, job):
+        """Latest progress event for a running job (progress, fps, ETA, count)"""
+        channel = find_channel(job['filename'])
+        return channel.snapshot() if channel else None
+
+    def _worker_loop(self, worker_id):
+        while not self._stop.is_set():
+            if self.ready_event is not None and not self.ready_event.is_set():
+                self.ready_event.wait(self.poll_interval)
+                continue
+            if self._model_failed():
+                # ready is also set when loading fails; keep jobs queued rather than count with no model
+                self._stop.wait(self.poll_interval)
+                continue
+
+            try:
+                job = self.store.claim(worker_id)
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            try:
+                self._run_job(job)
+            except Exception as e:
+                # Never let one job take the worker thread down with it
+                print(f"Error running job {job.get('_id')}: {e}")
+
+    def _model_failed(self):
+        pool = getattr(self.counter, 'model_pool', None)
+        if pool is None or pool.status != 'error':
+            return False
+        if not self._model_error_logged:
+            print(f"❌ Model failed to load, jobs stay queued: {pool.error}")
+            self._model_error_logged = True
+        return True
+
+    def _run_job(self, job):
+        job_id = job['_id']
+        options = job.get('options') or {}
+        print(f"▶️ Job {job_id} started: {job['filename']} (attempt {job['attempts']})")
+
+        try:
+            result = self.counter.process_video(
+                job['video_path'],
+                job['filename'],
+                export_annotated=options.get('export_annotated', False),
+                export_options=options.get('export_options')
+            )
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+
+        release_channel(job['filename'])
+
+        if result.get('success'):
+            self._update_status(job_id, {
+                'status': JOB_COMPLETED,
+                'finished_at': datetime.now(),
+                'error': None,
+                'result': {
+                    'pizza_count': result.get('pizza_count', 0),
+                    'total_frames': result.get('total_frames', 0),
+                    'detections': len(result.get('detections', [])),
+                    'annotated_export': result.get('annotated_export')
+                }
+            })
+            print(f"✅ Job {job_id} completed: {result.get('pizza_count', 0)} pizzas")
+            return
+
+        error = result.get('error', 'Processing failed')
+        if job['attempts'] <= job.get('max_retries', DEFAULT_MAX_RETRIES):
+            self._update_status(job_id, {
+                'status': JOB_QUEUED,
+                'error': error,
+                'worker': None,
+                'run_after': datetime.now() + timedelta(seconds=RETRY_BACKOFF_SECONDS * job['attempts'])
+            })
+            print(f"🔁 Job {job_id} failed, will retry: {error}")
+        else:
+            self._update_status(job_id, {
+                'status': JOB_FAILED,
+                'finished_at': datetime.now(),
+                'error': error
+            })
+            print(f"❌ Job {job_id} failed: {error}")
+
+    def _update_status(self, job_id, fields):
+        """Record a job outcome, retrying briefly. A job left 'running' is requeued on the next start."""
+        for attempt in range(1, STATUS_UPDATE_ATTEMPTS + 1):
+            try:
+                self.store.update(job_id, fields)
+                return True
+            except Exception as e:
+                print(f"Error updating job {job_id} (attempt {attempt}/{STATUS_UPDATE_ATTEMPTS}): {e}")
+                if attempt < STATUS_UPDATE_ATTEMPTS and self._stop.wait(attempt):
+                    break
+        return False
@@ -0,0 +1,137 @@
+import threading
+import time
+import cv2
+
+REPLAY_PREFIX = "replay:"
+RECONNECT_BACKOFF_SECONDS = (1, 2, 5, 10, 30)
+
+def parse_source(spec):
+    """Normalize a source spec: device index, http(s)/rtsp URL or replay:<file>"""
+    spec = str(spec).strip()
+    if spec.isdigit():
+        return 'device', int(spec)
+    if spec.startswith(REPLAY_PREFIX):
+        return 'replay', spec[len(REPLAY_PREFIX):]
+    if spec.split('://', 1)[0].lower() in ('http', 'https', 'rtsp', 'rtsps'):
+        return 'url', spec
+    raise ValueError(f"Unsupported source: {spec} (use a device index, http(s)/rtsp URL or replay:<file>)")
+
+class ReplayCapture:
+    """cv2.VideoCapture over a file that delivers frames at the file's real-time rate.
+
+    Lets the live path be exercised locally without a camera. With loop=True
+    the file restarts at the end instead of ending the stream.
+    """
+
+    def __init__(self, path, loop=False):
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        self.loop = loop
+        self._next_frame_at = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        now = time.monotonic()
+        if self._next_frame_at is not None and now < self._next_frame_at:
+            time.sleep(self._next_frame_at - now)
+        # Pace from the schedule, not from now, so slow reads do not drift
+        self._next_frame_at = max(self._next_frame_at or now, now - 1.0) + self.frame_interval
+
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+def open_capture(spec, loop_replay=False):
+    """Open a capture for a source spec"""
+    kind, target = parse_source(spec)
+    if kind == 'replay':
+        return ReplayCapture(target, loop=loop_replay)
+    return cv2.VideoCapture(target)
+
+class LiveSource:
+    """Continuous frame reader for a camera or network stream.
+
+    Length is unknown, so read() only ends when stop() is called or a
+    replayed file finishes. Dropped connections are reopened with backoff.
+    """
+
+    def __init__(self, spec, loop_replay=False, max_reconnects=None):
+        self.spec = spec
+        self.kind, _ = parse_source(spec)
+        self.loop_replay = loop_replay
+        self.max_reconnects = max_reconnects
+        self.reconnects = 0
+        self.connected = False
+        self.last_error = None
+        self.fps = 0.0
+        self._cap = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _open(self):
+        if self._cap is not None:
+            self._cap.release()
+        self._cap = open_capture(self.spec, self.loop_replay)
+        self.connected = self._cap.isOpened()
+        if self.connected:
+            self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 0.0
+        else:
+            self.last_error = f"Could not open {self.spec}"
+        return self.connected
+
+    def _reconnect(self):
+        """Reopen with backoff; False when stopped or out of attempts"""
+        attempt = 0
+        while not self._stop.is_set():
+            if self.max_reconnects is not None and self.reconnects >= self.max_reconnects:
+                return False
+            delay = RECONNECT_BACKOFF_SECONDS[min(attempt, len(RECONNECT_BACKOFF_SECONDS) - 1)]
+            if self._stop.wait(delay):
+                return False
+            self.reconnects += 1
+            attempt += 1
+            print(f"🔌 Reconnecting to {self.spec} (attempt {self.reconnects})")
+            if self._open():
+                return True
+        return False
+
+    def read(self):
+        """Next frame, or None when the source has ended or was stopped"""
+        if self._cap is None and not self._open() and not self._reconnect():
+            return None
+
+        while not self._stop.is_set():
+            ret, frame = self._cap.read()
+            if ret:
+                return frame
+            self.connected = False
+            # A replayed file ending is the end of the stream, not a dropout
+            if self.kind == 'replay':
+                return None
+            self.last_error = f"Lost connection to {self.spec}"
+            if not self._reconnect():
+                return None
+        return None
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self.connected = False
@@ -0,0 +1,219 @@
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pymongo import monitoring
+
+METRICS_ENABLED = os.getenv("PIZZA_METRICS_ENABLED", "1") not in ("0", "false", "False")
+METRICS_HOST = os.getenv("PIZZA_METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("PIZZA_METRICS_PORT", "9108"))
+
+# Seconds; covers sub-millisecond Mongo calls up to multi-second batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+class _Metric:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels_text(self.label_names, key)} {value}" for key, value in items]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def lines(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels_text(self.label_names + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_labels_text(self.label_names, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text format.
+
+    Hot paths only touch in-memory counters; values that are cheap to read
+    but costly to push (queue depths, RSS) come from collectors run per scrape.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector):
+        """Register collector(); it runs before every scrape to refresh gauges"""
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.lines())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+FRAMES_PROCESSED = REGISTRY.counter(
+    "pizza_frames_processed_total", "Frames read by processing jobs and live sources", ("pipeline",))
+FRAMES_DROPPED = REGISTRY.gauge(
+    "pizza_frames_dropped", "Frames dropped so far by running live sources and annotated exports", ("reason",))
+PIZZAS_COUNTED = REGISTRY.counter(
+    "pizza_pizzas_counted_total", "Pizzas counted", ("pipeline",))
+INFERENCE_BATCH_SECONDS = REGISTRY.histogram(
+    "pizza_inference_batch_seconds", "Model predict time per micro-batch")
+INFERENCE_WAIT_SECONDS = REGISTRY.histogram(
+    "pizza_inference_wait_seconds", "Time a frame waited before its batch ran")
+INFERENCE_BATCH_SIZE = REGISTRY.histogram(
+    "pizza_inference_batch_size", "Frames per micro-batch", buckets=(1, 2, 4, 8, 16, 32))
+QUEUE_DEPTH = REGISTRY.gauge(
+    "pizza_queue_depth", "Items waiting in internal queues", ("queue",))
+ACTIVE_JOBS = REGISTRY.gauge(
+    "pizza_active_jobs", "Processing jobs by state", ("status",))
+LIVE_SOURCES = REGISTRY.gauge(
+    "pizza_live_sources", "Supervised live sources by status", ("status",))
+MONGO_OPERATION_SECONDS = REGISTRY.histogram(
+    "pizza_mongo_operation_seconds", "MongoDB command latency", ("command", "outcome"))
+CACHE_REQUESTS = REGISTRY.counter(
+    "pizza_cache_requests_total", "Cache lookups", ("cache", "result"))
+MONGO_AVAILABLE = REGISTRY.gauge(
+    "pizza_mongo_available", "1 when MongoDB answered the last health check")
+PROCESS_RSS_BYTES = REGISTRY.gauge(
+    "pizza_process_resident_memory_bytes", "Resident set size of this process")
+PROCESS_CPU_PERCENT = REGISTRY.gauge(
+    "pizza_process_cpu_percent", "CPU use of this process since the previous scrape")
+PROCESS_THREADS = REGISTRY.gauge(
+    "pizza_process_threads", "Threads in this process")
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo listener recording latency per command (insert, update, find, count, aggregate, ...)"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_OPERATION_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome='ok')
+
+    def failed(self, event):
+        MONGO_OPERATION_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome='error')
+
+_process = None
+
+def _collect_process():
+    global _process
+    if _process is None:
+        import psutil
+        _process = psutil.Process()
+    process = _process
+    PROCESS_RSS_BYTES.set(process.memory_info().rss)
+    # First call returns 0.0; later calls measure since the previous scrape
+    PROCESS_CPU_PERCENT.set(process.cpu_percent(interval=None))
+    PROCESS_THREADS.set(process.num_threads())
+
+REGISTRY.add_collector(_collect_process)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the Streamlit log
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics on a daemon thread; safe to call more than once"""
+    global _server
+    if not METRICS_ENABLED:
+        return None
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint not started on {host}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        print(f"📈 Metrics available at http://{host}:{port}/metrics")
+        return _server
@@ -0,0 +1,236 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+import yaml
+
+from utils.job_queue import DEFAULT_CONCURRENCY
+from utils.inference import InferenceService
+
+# One model per concurrent job plus one for stream viewers by default
+DEFAULT_POOL_SIZE = int(os.getenv("PIZZA_MODEL_POOL_SIZE", str(DEFAULT_CONCURRENCY + 1)))
+DEFAULT_TRACKER = "bytetrack.yaml"
+
+class TrackedDetections:
+    """Tracked boxes for one frame as NumPy arrays"""
+
+    def __init__(self, xyxy=None, track_ids=None, confidences=None, classes=None):
+        self.xyxy = np.empty((0, 4), dtype=np.float32) if xyxy is None else xyxy
+        self.track_ids = np.empty(0, dtype=int) if track_ids is None else track_ids
+        self.confidences = np.empty(0, dtype=np.float32) if confidences is None else confidences
+        self.classes = np.empty(0, dtype=int) if classes is None else classes
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    @property
+    def xywh(self):
+        """Center x, center y, width, height"""
+        xywh = np.empty_like(self.xyxy)
+        xywh[:, 0] = (self.xyxy[:, 0] + self.xyxy[:, 2]) / 2
+        xywh[:, 1] = (self.xyxy[:, 1] + self.xyxy[:, 3]) / 2
+        xywh[:, 2] = self.xyxy[:, 2] - self.xyxy[:, 0]
+        xywh[:, 3] = self.xyxy[:, 3] - self.xyxy[:, 1]
+        return xywh
+
+    def filter(self, mask):
+        return TrackedDetections(self.xyxy[mask], self.track_ids[mask], self.confidences[mask], self.classes[mask])
+
+def load_tracker_config(tracker=DEFAULT_TRACKER):
+    """Load an ultralytics tracker YAML into the namespace BYTETracker expects"""
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+
+    with open(check_yaml(tracker), encoding="utf-8") as f:
+        return IterableSimpleNamespace(**yaml.safe_load(f))
+
+_session_tracker_class = None
+
+def session_tracker_class():
+    """BYTETracker subclass that numbers tracks from its own counter.
+
+    Stock BYTETracker draws IDs from BaseTrack._count, one global for the
+    process, and reset() zeroes it, so a session starting a new video would
+    renumber tracks under every other running session. Here reset_id() and
+    each new STrack's next_id() use a counter owned by the tracker.
+    """
+    global _session_tracker_class
+    if _session_tracker_class is None:
+        from ultralytics.trackers.byte_tracker import BYTETracker
+
+        class SessionBYTETracker(BYTETracker):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.reset_id()
+
+            def reset_id(self):
+                self._ids = itertools.count(1)
+
+            def next_id(self):
+                return next(self._ids)
+
+            def init_track(self, *args, **kwargs):
+                tracks = super().init_track(*args, **kwargs)
+                for track in tracks:
+                    # Shadows the STrack.next_id staticmethod used by activate()
+                    track.next_id = self.next_id
+                return tracks
+
+        _session_tracker_class = SessionBYTETracker
+    return _session_tracker_class
+
+class TrackingSession:
+    """ByteTrack state owned by one job or stream, over models leased from a pool.
+
+    model.track(persist=True) keeps tracker state on the model object, so
+    every caller sharing it shares tracks. A session keeps its own tracker
+    and only borrows a model for the duration of each detection call.
+    """
+
+    def __init__(self, pool, tracker=DEFAULT_TRACKER, frame_rate=30):
+        self.pool = pool
+        self.tracker_config = load_tracker_config(tracker)
+        self.frame_rate = frame_rate
+        self.reset()
+
+    def reset(self):
+        """Drop all tracks, e.g. when a new video starts"""
+        self.tracker = session_tracker_class()(args=self.tracker_config, frame_rate=self.frame_rate)
+
+    def detect(self, frame, classes, conf):
+        """Run detection through the pool's shared micro-batches; returns Boxes on the CPU"""
+        return self.pool.inference.predict(frame, classes=classes, conf=conf)
+
+    def track(self, frame, classes, conf, timer=None):
+        """Detect and associate boxes with this session's tracks"""
+        start = timer.now() if timer else 0.0
+        boxes = self.detect(frame, classes, conf)
+        if timer:
+            timer.add('inference', start)
+            start = timer.now()
+        tracks = self.tracker.update(boxes.numpy(), frame)
+        if timer:
+            timer.add('tracking', start)
+        if len(tracks) == 0:
+            return TrackedDetections()
+
+        # Rows are x1, y1, x2, y2, track_id, score, cls, det_index
+        return TrackedDetections(
+            xyxy=tracks[:, :4].astype(np.float32),
+            track_ids=tracks[:, 4].astype(int),
+            confidences=tracks[:, 5].astype(np.float32),
+            classes=tracks[:, 6].astype(int)
+        )
+
+class ModelPool:
+    """Bounded pool of YOLO instances handed out as exclusive leases.
+
+    The first model is imported, loaded and warmed up on a background thread
+    (start_loading) so the UI can render while torch starts. Leases wait for
+    it; further models are loaded lazily up to `size`, then callers wait.
+    Callers normally go through `inference`, which leases per batch.
+    """
+
+    def __init__(self, model_path, size=DEFAULT_POOL_SIZE):
+        self.model_path = model_path
+        self.size = max(1, int(size))
+        self.primary = None
+        self.status = 'not_started'
+        self.error = None
+        self.timings = {}
+        self.ready = threading.Event()
+        self._available = queue.Queue()
+        self._created = 1
+        self._lock = threading.Lock()
+        self._loader = None
+        # Every caller's frames are batched together before reaching a model
+        self.inference = InferenceService(self)
+
+    def start_loading(self):
+        """Load and warm up the first model in the background"""
+        with self._lock:
+            if self._loader is not None:
+                return
+            self.status = 'loading'
+            self._loader = threading.Thread(target=self._load_primary, daemon=True)
+        self._loader.start()
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the first model is usable; raises if loading failed"""
+        self.start_loading()
+        if not self.ready.wait(timeout):
+            raise TimeoutError("Model is still loading")
+        if self.primary is None:
+            raise RuntimeError(f"Model failed to load: {self.error}")
+
+    def _load_primary(self):
+        try:
+            start = time.perf_counter()
+            from ultralytics import YOLO  # imports torch, the slow part of a cold start
+            self.timings['import_seconds'] = round(time.perf_counter() - start, 2)
+
+            start = time.perf_counter()
+            model = YOLO(self.model_path)
+            self.timings['load_seconds'] = round(time.perf_counter() - start, 2)
+
+            # First inference initialises the predictor; pay for it before any job does
+            start = time.perf_counter()
+            model.predict(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+            self.timings['warmup_seconds'] = round(time.perf_counter() - start, 2)
+
+            self.primary = model
+            self._available.put(model)
+            self.status = 'ready'
+            print(f"✅ Model ready: {self.timings}")
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'error'
+            print(f"❌ Model loading failed: {e}")
+        finally:
+            self.ready.set()
+
+    def _load(self):
+        from ultralytics import YOLO
+        return YOLO(self.model_path)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Borrow a model exclusively for the duration of the block"""
+        self.wait_until_ready(timeout)
+        try:
+            model = self._available.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_grow = self._created < self.size
+                if can_grow:
+                    self._created += 1
+            if not can_grow:
+                model = self._available.get(timeout=timeout)
+            else:
+                try:
+                    model = self._load()
+                except Exception:
+                    # Give the slot back so a failed load does not shrink the pool
+                    with self._lock:
+                        self._created -= 1
+                    raise
+        try:
+            yield model
+        finally:
+            self._available.put(model)
+
+    def session(self, tracker=DEFAULT_TRACKER, frame_rate=30):
+        """New tracking session with fresh tracker state"""
+        return TrackingSession(self, tracker=tracker, frame_rate=frame_rate)
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'loaded': self._created if self.primary is not None else 0,
+            'available': self._available.qsize(),
+            'status': self.status,
+            'inference': self.inference.stats()
+        }
@@ -2,129 +2,491 @@ import cv2
 import os
 import numpy as np
 import streamlit as st
-from ultralytics import YOLO
-from pymongo import MongoClient
 from datetime import datetime, timedelta
-from collections import defaultdict
 from dotenv import load_dotenv
 import threading
 import time
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+from utils.video_export import AnnotatedVideoWriter, DEFAULT_EXPORT_OPTIONS, get_annotated_path
+from utils.job_queue import JobQueue, MongoJobStore, SQLiteJobStore, migrate_sqlite_jobs, JOB_QUEUED, JOB_RUNNING
+from utils.progress import get_channel
+from utils.model_pool import ModelPool
+from utils.db_health import create_mongo_client, MongoHealthChecker, CONNECTION_ERRORS
+from utils.settings_store import SettingsStore
+from utils.counting import CountingState, is_pizza_removed
+from utils.live_source import LiveSource
+from utils.ingest import IngestSupervisor
+from utils.stage_timer import StageTimer
+from utils.track_store import TrackRecorder, RECORD_TRACKS, get_tracks_path, load_tracks, recount_tracks
+from utils.sweep import sweep_tracks, DEFAULT_SWEEP_GRID
+from utils.timeline import TimelineBuilder, count_in_range
+from utils.rollups import RollupStore, CONFIDENCE_BINS, ROLLUP_HOUR, ROLLUP_DAY
+from utils.detection_export import export_detections
+from utils.feedback_counters import FeedbackCounters, feedback_delta
+from utils.metrics import REGISTRY, FRAMES_PROCESSED, FRAMES_DROPPED, PIZZAS_COUNTED, QUEUE_DEPTH
+from utils.metrics import ACTIVE_JOBS, LIVE_SOURCES, MONGO_AVAILABLE, start_metrics_server
 
 load_dotenv()
 
+# Seconds between incremental count commits for live sources
+LIVE_COMMIT_INTERVAL = 5
+# Rows per page of the analytics detection log
+DETECTION_PAGE_SIZE = 50
+# Database holding every collection; benchmarks point this elsewhere
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "pizza_detection")
+# Upload states that make a re-upload of the same content a duplicate; failed uploads can be retried
+DUPLICATE_UPLOAD_STATUSES = ('pending', 'processing', 'completed')
+# Each is exposed as self.<name>_collection, or None without a client
+COLLECTION_NAMES = ('detections', 'feedback', 'feedback_archive', 'videos', 'settings', 'settings_history', 'jobs',
+                    'live_sources', 'rollups_hourly', 'rollups_daily', 'feedback_counters')
+
+def get_mongodb_uri():
+    """MongoDB URI from the environment, falling back to Streamlit secrets"""
+    uri = os.getenv("MONGODB_URI")
+    if uri:
+        return uri
+    try:
+        return st.secrets["MONGODB_URI"]
+    except Exception:
+        print("⚠️ MONGODB_URI not set, using mongodb://localhost:27017")
+        return "mongodb://localhost:27017"
+
+def draw_detection_boxes(frame, xyxy, labels=None, color=(0, 255, 0)):
+    """Draw an (N, 4) array of xyxy boxes and optional labels onto frame in place"""
+    if len(xyxy) == 0:
+        return frame
+    
+    corners = np.asarray(xyxy).round().astype(int).tolist()
+    if labels is None:
+        for x1, y1, x2, y2 in corners:
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+    else:
+        for (x1, y1, x2, y2), label in zip(corners, labels):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
+
 class PizzaCounter:
     _instance = None
     _initialized = False
     
-    def __new__(cls, model_path="./models/yolo11n.pt", mongodb_uri=None):
+    def __new__(cls, model_path="./models/yolo11n.pt", mongodb_uri=None, start_job_workers=True):
         if cls._instance is None:
             cls._instance = super(PizzaCounter, cls).__new__(cls)
         return cls._instance
     
-    def __init__(self, model_path="./models/yolo11n.pt", mongodb_uri=None):
+    def __init__(self, model_path="./models/yolo11n.pt", mongodb_uri=None, start_job_workers=True):
         """Initialize pizza counter với thuật toán gốc - SINGLETON PATTERN"""
         if self._initialized:
             return
+        
+        # Startup phase timings in seconds, shown on the Settings page
+        self.startup_timings = {}
+        # Set when feedback was buffered offline, so counters are recounted on reconnect
+        self._feedback_counters_stale = False
+        # Counter of '<collection>.<method>' for every _db_write while set (benchmarks)
+        self.write_counts = None
+        phase_start = time.perf_counter()
             
         if mongodb_uri is None:
-            mongodb_uri = st.secrets["MONGODB_URI"]
+            mongodb_uri = get_mongodb_uri()
         
         if model_path is None:
             model_path = "./models/yolo11n.pt"
         if not os.path.exists(model_path):
             print("Downloading YOLO model...")
-        self.model = YOLO(model_path)
+        # Each job/stream leases a model and owns its own tracker state.
+        # Import, load and warmup run in the background so the UI renders immediately.
+        self.model_path = model_path
+        self.model_pool = ModelPool(model_path)
+        self.model_pool.start_loading()
         
         # COCO dataset class IDs - pizza is class 53
         self.pizza_class_id = 53
-        self.classes_to_detect = [self.pizza_class_id]
         
-        # MongoDB connection với proper error handling
-        self.db_available = False
+        # MongoDB connection với proper error handling. Timeouts are short so a
+        # missing server fails fast; the health checker reconnects later.
         try:
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client.pizza_detection
-            # Collections
-            self.detections_collection = self.db.detections
-            self.feedback_collection = self.db.feedback
-            self.videos_collection = self.db.videos
-            self.settings_collection = self.db.settings
-            
-            # Test connection
-            self.client.admin.command('ping')
-            self.db_available = True
-            print("✅ MongoDB connected successfully")
+            self.client = create_mongo_client(mongodb_uri)
         except Exception as e:
-            print(f"⚠️ MongoDB connection failed: {e}")
+            print(f"⚠️ Invalid MongoDB configuration: {e}")
             self.client = None
-            self.db = None
-            self.db_available = False
+        # Without a client the health checker keeps trying to create one
+        self.db_health = MongoHealthChecker(self.client, client_factory=lambda: create_mongo_client(mongodb_uri))
+        self._bind_collections()
+        if self.client is not None:
+            # Test connection
+            if self.db_health.ping():
+                print("✅ MongoDB connected successfully")
+                self.ensure_indexes()
+            else:
+                print(f"⚠️ MongoDB connection failed: {self.db_health.last_error}")
         
-        # Initialize settings
+        # Flip db_available back and replay buffered writes when MongoDB returns
+        self.db_health.on_up = self._on_db_reconnect
+        self.db_health.start()
+        
+        self.startup_timings['mongodb_seconds'] = round(time.perf_counter() - phase_start, 2)
+        phase_start = time.perf_counter()
+        
+        # Settings live in memory; changes are versioned and persisted with a debounce
+        self.settings = SettingsStore(
+            self.settings_collection,
+            self.settings_history_collection,
+            db_write=self._db_write
+        )
         self.init_default_settings()
         self.load_settings()
+        self.startup_timings['settings_seconds'] = round(time.perf_counter() - phase_start, 2)
+        
+        # Hourly/daily analytics totals, incremented alongside every write
+        self.rollups = RollupStore(
+            self.rollups_hourly_collection,
+            self.rollups_daily_collection,
+            db_write=self._db_write
+        )
+        self.feedback_counters = FeedbackCounters(self.feedback_counters_collection, db_write=self._db_write)
+        if self.db_available:
+            self._backfill_rollups_if_empty()
         
         # Processing state
         self.processing_videos = {}
         
+        # Durable job queue: MongoDB when reachable, local SQLite otherwise. The
+        # choice holds until restart; SQLite jobs move to MongoDB on the next start.
+        try:
+            if self.db_available:
+                job_store = MongoJobStore(self.jobs_collection)
+                moved = migrate_sqlite_jobs(job_store)
+                if moved:
+                    print(f"♻️ Moved {moved} job(s) from local SQLite to MongoDB")
+            else:
+                job_store = SQLiteJobStore()
+        except Exception as e:
+            print(f"⚠️ Job store unavailable, using local SQLite: {e}")
+            job_store = SQLiteJobStore()
+        # Workers hold queued jobs until the model is ready
+        self.job_queue = JobQueue(self, job_store, ready_event=self.model_pool.ready)
+        if start_job_workers:
+            self.job_queue.start()
+        
+        # Live camera/stream sources, each counted on its own threads
+        self.ingest = IngestSupervisor(self)
+        
+        # Prometheus /metrics alongside the app; gauges refresh on each scrape
+        self._export_frames_dropped = 0
+        REGISTRY.add_collector(self._collect_metrics)
+        start_metrics_server()
+        
         self._initialized = True
+        print(f"🚀 PizzaCounter started: {self.startup_timings} (model loading in background)")
 
-    def submit_feedback(self, detection_id, feedback_type, user_comment=None):
-        """Submit feedback for a detection"""
+    @property
+    def db_available(self):
+        """Whether MongoDB answered the most recent health check"""
+        return self.db_health.available
+
+    def _bind_collections(self):
+        """Point the collection attributes at the client's database, or None without a client"""
+        self.db = self.client[MONGODB_DATABASE] if self.client is not None else None
+        for name in COLLECTION_NAMES:
+            setattr(self, f"{name}_collection", self.db[name] if self.db is not None else None)
+
+    def _attach_client(self):
+        """Adopt the client the health checker created after a failed startup"""
+        self.client = self.db_health.client
+        self._bind_collections()
+        self.settings.attach(self.settings_collection, self.settings_history_collection)
+        self.rollups.collections = {ROLLUP_HOUR: self.rollups_hourly_collection, ROLLUP_DAY: self.rollups_daily_collection}
+        self.feedback_counters.collection = self.feedback_counters_collection
+        print("✅ MongoDB client created after startup")
+
+    def _on_db_reconnect(self):
+        """Called by the health checker when MongoDB becomes reachable again, before replay"""
+        if self.client is None:
+            self._attach_client()
+        self.ensure_indexes()
+        # Read the stored settings before anything can write over them with defaults
+        self.load_settings()
+        self.init_default_settings()
+        if isinstance(getattr(getattr(self, 'job_queue', None), 'store', None), SQLiteJobStore):
+            print("ℹ️ Jobs stay in local SQLite until restart; they move to MongoDB then")
+        if self._feedback_counters_stale:
+            self._start_feedback_reconcile()
+
+    def _start_feedback_reconcile(self):
+        threading.Thread(target=self._reconcile_feedback_counters, name="feedback-reconcile", daemon=True).start()
+
+    def _reconcile_feedback_counters(self):
+        """Recount feedback after buffered submissions have been replayed"""
+        # Replay starts right after on_up; wait until the buffer drains
+        while self.db_available and self.db_health.pending_writes():
+            time.sleep(0.5)
+        # Another reconcile may already have picked this up
+        if not self.db_available or not self._feedback_counters_stale:
+            return
+        self._feedback_counters_stale = False
+        result = self.rebuild_rollups()
+        if not result.get('success'):
+            self._feedback_counters_stale = True
+        print(f"📊 Feedback counters recounted: {result}")
+
+    def ensure_indexes(self):
+        """Create indexes used by the processing write path"""
+        try:
+            self.videos_collection.create_index('filename')
+            self.videos_collection.create_index('content_hash')
+            # Serves timestamp range queries and (timestamp, _id) keyset pages
+            self.detections_collection.create_index([('timestamp', -1), ('_id', -1)])
+            self.detections_collection.create_index('filename')
+            self.settings_history_collection.create_index('version')
+            self.live_sources_collection.create_index('name', unique=True)
+        except Exception as e:
+            print(f"Error creating indexes: {e}")
+        
+        # One feedback document per detection. Databases from before feedback was
+        # upserted keep their non-unique index until `dedupe-feedback` has run.
+        try:
+            index = self.feedback_collection.index_information().get('detection_id_1')
+            if index is None or index.get('unique'):
+                self.feedback_collection.create_index('detection_id', unique=True)
+            else:
+                print("ℹ️ feedback.detection_id is not unique yet; run: python -m utils.pizza_counter dedupe-feedback")
+        except Exception as e:
+            print(f"Error creating feedback index (run dedupe-feedback if detections have duplicate feedback): {e}")
+
+    def dedupe_feedback(self):
+        """One-off migration: keep the latest feedback per detection and make detection_id unique.
+
+        Superseded documents are copied to feedback_archive before they are
+        removed, so nothing is lost. Safe to run again. Counters are not
+        affected: they already count only the latest feedback per detection.
+        """
         if not self.db_available:
             return {'success': False, 'error': 'Database not available'}
         
         try:
-            feedback_doc = {
-                'detection_id': detection_id,
+            archived_at = datetime.now()
+            archived = 0
+            duplicates = self.feedback_collection.aggregate([
+                {'$sort': {'timestamp': -1}},
+                {'$group': {'_id': '$detection_id', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+                {'$match': {'count': {'$gt': 1}}}
+            ], allowDiskUse=True)
+            for group in duplicates:
+                superseded = {'_id': {'$in': group['ids'][1:]}}
+                for doc in self.feedback_collection.find(superseded):
+                    # Keyed by the original _id, so a rerun after an interruption archives nothing twice
+                    self.feedback_archive_collection.replace_one(
+                        {'_id': doc['_id']}, dict(doc, archived_at=archived_at), upsert=True
+                    )
+                archived += self.feedback_collection.delete_many(superseded).deleted_count
+            
+            index = self.feedback_collection.index_information().get('detection_id_1')
+            if index and not index.get('unique'):
+                self.feedback_collection.drop_index('detection_id_1')
+            self.feedback_collection.create_index('detection_id', unique=True)
+            print(f"🧹 Archived {archived} superseded feedback document(s) to feedback_archive; detection_id is now unique")
+            return {'success': True, 'archived': archived}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def _db_write(self, collection, method, *args, **kwargs):
+        """Run a write now, or buffer it for replay while MongoDB is down"""
+        if self.client is None:
+            return None
+        write_counts = self.write_counts
+        if write_counts is not None:
+            write_counts[f"{collection.name}.{method}"] += 1
+        # Writes queue behind buffered ones so replay keeps them in order
+        if self.db_available and not self.db_health.pending_writes():
+            try:
+                return getattr(collection, method)(*args, **kwargs)
+            except CONNECTION_ERRORS as e:
+                self.db_health.mark_down(e)
+        # Replay belongs to the health checker thread, never the caller's
+        self.db_health.buffer_write(collection, method, args, kwargs)
+        return None
+
+    @property
+    def model(self):
+        """Primary YOLO model, or None while it is still loading"""
+        return self.model_pool.primary
+
+    @property
+    def model_ready(self):
+        return self.model_pool.status == 'ready'
+
+    def _collect_metrics(self):
+        """Refresh gauges for a metrics scrape"""
+        MONGO_AVAILABLE.set(1 if self.db_available else 0)
+        QUEUE_DEPTH.set(self.model_pool.inference.stats()['queued'], queue='inference')
+        QUEUE_DEPTH.set(self.db_health.pending_writes(), queue='mongo_write_buffer')
+        
+        jobs = self.job_queue.active_jobs()
+        ACTIVE_JOBS.set(sum(1 for job in jobs if job['status'] == JOB_QUEUED), status=JOB_QUEUED)
+        ACTIVE_JOBS.set(sum(1 for job in jobs if job['status'] == JOB_RUNNING), status=JOB_RUNNING)
+        QUEUE_DEPTH.set(sum(1 for job in jobs if job['status'] == JOB_QUEUED), queue='jobs')
+        
+        sources = self.ingest.stats()
+        statuses = {}
+        for source in sources:
+            statuses[source['status']] = statuses.get(source['status'], 0) + 1
+        for status in ('starting', 'running', 'restarting', 'stopped', 'ended'):
+            LIVE_SOURCES.set(statuses.get(status, 0), status=status)
+        FRAMES_DROPPED.set(sum(source['dropped_frames'] for source in sources), reason='live_buffer_full')
+        FRAMES_DROPPED.set(sum(source['capped_frames'] for source in sources), reason='live_fps_cap')
+        FRAMES_DROPPED.set(self._export_frames_dropped, reason='export_queue_full')
+
+    def get_startup_status(self):
+        """Startup phase timings and model readiness"""
+        return {
+            'model_status': self.model_pool.status,
+            'model_error': self.model_pool.error,
+            'timings': dict(self.startup_timings, **self.model_pool.timings)
+        }
+
+    def submit_feedback(self, detection_id, feedback_type, user_comment=None):
+        """Submit feedback for a detection; resubmitting replaces the earlier feedback.
+
+        The feedback document is authoritative. Counters and rollups follow it
+        with separate $inc writes; if those fail they are recounted, so they
+        are eventually rather than immediately consistent with it.
+        """
+        if self.client is None:
+            return {'success': False, 'error': 'Database not available'}
+        
+        try:
+            now = datetime.now()
+            # One feedback document per detection, so repeated clicks never add up
+            feedback_filter = {'detection_id': detection_id}
+            feedback_update = {'$set': {
                 'feedback_type': feedback_type,
                 'user_comment': user_comment,
-                'timestamp': datetime.now()
-            }
-            result = self.feedback_collection.insert_one(feedback_doc)
-            return {'success': True, 'feedback_id': str(result.inserted_id)}
+                'timestamp': now,
+                'filename': self._detection_filename(detection_id)
+            }}
+            if not self.db_available or self.db_health.pending_writes():
+                # The previous feedback is unknown until replay; recount then
+                self._db_write(self.feedback_collection, 'update_one', feedback_filter, feedback_update, upsert=True)
+                self._feedback_counters_stale = True
+                return {'success': True, 'buffered': True}
+            
+            try:
+                try:
+                    previous = self.feedback_collection.find_one_and_update(
+                        feedback_filter, feedback_update,
+                        projection={'feedback_type': 1, 'timestamp': 1},
+                        upsert=True
+                    )
+                except DuplicateKeyError:
+                    # A concurrent submission inserted it first; this one now updates it
+                    previous = self.feedback_collection.find_one_and_update(
+                        feedback_filter, feedback_update,
+                        projection={'feedback_type': 1, 'timestamp': 1},
+                        upsert=True
+                    )
+            except CONNECTION_ERRORS as e:
+                self.db_health.mark_down(e)
+                self.db_health.buffer_write(self.feedback_collection, 'update_one',
+                                            (feedback_filter, feedback_update), {'upsert': True})
+                self._feedback_counters_stale = True
+                return {'success': True, 'buffered': True}
+            
+            previous_type = previous.get('feedback_type') if previous else None
+            try:
+                self.feedback_counters.apply(feedback_update['$set']['filename'], feedback_delta(previous_type, feedback_type))
+                # Daily/hourly feedback moves to the hour of the latest submission
+                if previous and previous.get('timestamp'):
+                    self.rollups.record_feedback(previous['timestamp'], previous_type == 'correct', count=-1)
+                self.rollups.record_feedback(now, feedback_type == 'correct')
+            except Exception as e:
+                # The feedback itself is saved; recount the counters from it
+                print(f"⚠️ Feedback counters update failed, recounting: {e}")
+                self._feedback_counters_stale = True
+                self._start_feedback_reconcile()
+            return {'success': True, 'updated': previous is not None}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def _detection_filename(self, detection_id):
+        """Video filename of a detection, for per-video feedback counters"""
+        if not self.db_available:
+            return None
+        try:
+            detection = self.detections_collection.find_one({'_id': ObjectId(detection_id)}, {'filename': 1})
+        except (InvalidId, TypeError):
+            return None
+        except Exception as e:
+            print(f"Error looking up detection {detection_id}: {e}")
+            return None
+        return detection.get('filename') if detection else None
+
+    def get_feedback_accuracy(self, filename=None):
+        """Running feedback counts and accuracy, overall or for one video"""
+        if not self.db_available:
+            return {'correct': 0, 'incorrect': 0, 'total': 0, 'accuracy': 0}
+        if filename:
+            return self.feedback_counters.for_video(filename)
+        return self.feedback_counters.overall()
+
     # [Keep all other existing methods unchanged]
     def init_default_settings(self):
         """Initialize default model settings - FIX"""
         if not self.db_available:
             return
-        
-        try:
-            if self.settings_collection.count_documents({}) == 0:
-                default_settings = {
-                    'confidence_threshold': 0.5,
-                    'tracking_threshold': 0.3,
-                    'movement_threshold': 50,
-                    'frame_skip': 3,
-                    'created_at': datetime.now()
-                }
-                self.settings_collection.insert_one(default_settings)
-        except Exception as e:
-            print(f"Error initializing settings: {e}")
+        self.settings.ensure_defaults()
 
     def load_settings(self):
         """Load current model settings - FIX"""
-        try:
-            if self.db_available:
-                settings = self.settings_collection.find_one({}, sort=[('created_at', -1)])
-                if settings:
-                    self.confidence_threshold = settings.get('confidence_threshold', 0.5)
-                    self.tracking_threshold = settings.get('tracking_threshold', 0.3)
-                    self.movement_threshold = settings.get('movement_threshold', 50)
-                    self.frame_skip = settings.get('frame_skip', 3)
-                    return
-        except Exception as e:
-            print(f"Error loading settings: {e}")
-        
-        self.confidence_threshold = 0.5
-        self.tracking_threshold = 0.3
-        self.movement_threshold = 50
-        self.frame_skip = 3
+        if self.db_available:
+            self.settings.load()
+
+    # Settings are read from memory; assigning one schedules a debounced save
+    @property
+    def confidence_threshold(self):
+        return self.settings.get('confidence_threshold')
+
+    @confidence_threshold.setter
+    def confidence_threshold(self, value):
+        self.settings.update(confidence_threshold=value)
+
+    @property
+    def tracking_threshold(self):
+        return self.settings.get('tracking_threshold')
+
+    @tracking_threshold.setter
+    def tracking_threshold(self, value):
+        self.settings.update(tracking_threshold=value)
+
+    @property
+    def movement_threshold(self):
+        return self.settings.get('movement_threshold')
+
+    @movement_threshold.setter
+    def movement_threshold(self, value):
+        self.settings.update(movement_threshold=value)
+
+    @property
+    def frame_skip(self):
+        return self.settings.get('frame_skip')
 
-    def process_video(self, video_path, filename, progress_callback=None):
+    @frame_skip.setter
+    def frame_skip(self, value):
+        self.settings.update(frame_skip=value)
+
+    @property
+    def classes_to_detect(self):
+        return list(self.settings.get('classes_to_detect'))
+
+    @classes_to_detect.setter
+    def classes_to_detect(self, value):
+        self.settings.update(classes_to_detect=value)
+
+    def process_video(self, video_path, filename, progress_callback=None, export_annotated=False, export_options=None):
+        """Process a video file, optionally writing an annotated MP4 alongside it"""
         try:
             # Mark video as processing
             self.processing_videos[filename] = {
@@ -133,53 +495,56 @@ class PizzaCounter:
                 'start_time': datetime.now()
             }
             
-            # Check if video already exists in DB
-            video_id = None
-            if self.db_available:
-                existing_video = self.videos_collection.find_one({'filename': filename})
-                if existing_video:
-                    # Update existing video
-                    video_id = existing_video['_id']
-                    self.videos_collection.update_one(
-                        {'_id': video_id},
-                        {'$set': {
-                            'status': 'processing',
-                            'processed_at': None,
-                            'pizza_count': 0,
-                            'total_frames': 0,
-                            'processed_frames': 0
-                        }}
-                    )
-                else:
-                    # Insert new video record
-                    video_doc = {
-                        'filename': filename,
-                        'file_path': video_path,
-                        'status': 'processing',
-                        'uploaded_at': datetime.now(),
-                        'processed_at': None,
-                        'pizza_count': 0,
-                        'total_frames': 0,
-                        'processed_frames': 0
-                    }
-                    video_result = self.videos_collection.insert_one(video_doc)
-                    video_id = video_result.inserted_id
+            # Create or reset the video record. A single upsert keyed by filename
+            # is idempotent, so it can be buffered and replayed if MongoDB is down.
+            previous = self._db_write(
+                self.videos_collection, 'find_one_and_update',
+                {'filename': filename},
+                {'$set': {
+                    'status': 'processing',
+                    'processed_at': None,
+                    'pizza_count': 0,
+                    'total_frames': 0,
+                    'processed_frames': 0
+                },
+                 '$setOnInsert': {
+                    'file_path': video_path,
+                    'uploaded_at': datetime.now()
+                }},
+                projection={'status': 1, 'processed_at': 1},
+                upsert=True
+            )
+            # A reprocessed video moves to its new processing hour in the rollups
+            if previous and previous.get('status') == 'completed' and previous.get('processed_at'):
+                self.rollups.record(previous['processed_at'], videos_processed=-1)
             
             # Process using original algorithm
-            result = self.detect_and_count_pizzas_original(video_path, filename, progress_callback)
+            export = None
+            if export_annotated:
+                export = dict(DEFAULT_EXPORT_OPTIONS, **(export_options or {}))
+                export.setdefault('output_path', get_annotated_path(filename))
+            result = self.detect_and_count_pizzas_original(video_path, filename, progress_callback, export=export)
             
             # Update video record
-            if self.db_available and video_id is not None:
-                self.videos_collection.update_one(
-                    {'_id': video_id},
-                    {'$set': {
-                        'status': 'completed',
-                        'processed_at': datetime.now(),
-                        'pizza_count': result['pizza_count'],
-                        'total_frames': result.get('total_frames', 0),
-                        'processed_frames': result.get('processed_frames', 0)
-                    }}
-                )
+            video_update = {
+                'status': 'completed',
+                'processed_at': datetime.now(),
+                'pizza_count': result['pizza_count'],
+                'total_frames': result.get('total_frames', 0),
+                'processed_frames': result.get('processed_frames', 0),
+                'settings_version': result.get('settings_version'),
+                'resolution': result.get('resolution')
+            }
+            if result.get('annotated_export'):
+                video_update['annotated_export'] = result['annotated_export']
+            if result.get('stage_timings'):
+                video_update['stage_timings'] = result['stage_timings']
+            if result.get('track_file'):
+                video_update['track_file'] = result['track_file']
+            if result.get('timeline'):
+                video_update['timeline'] = result['timeline']
+            self._db_write(self.videos_collection, 'update_one', {'filename': filename}, {'$set': video_update})
+            self.rollups.record_video(video_update['processed_at'])
             
             # Update processing state
             self.processing_videos[filename] = {
@@ -193,167 +558,303 @@ class PizzaCounter:
                 'success': True,
                 'pizza_count': result['pizza_count'],
                 'total_frames': result.get('total_frames', 0),
-                'detections': result.get('detections', [])
+                'detections': result.get('detections', []),
+                'annotated_export': result.get('annotated_export'),
+                'stage_timings': result.get('stage_timings')
             }
             
         except Exception as e:
             if filename in self.processing_videos:
                 self.processing_videos[filename]['status'] = 'error'
                 self.processing_videos[filename]['error'] = str(e)
+            get_channel(filename).finish(0, status='error', error=str(e))
             
-            if self.db_available and video_id is not None:
-                self.videos_collection.update_one(
-                    {'_id': video_id},
-                    {'$set': {'status': 'error', 'error_message': str(e)}}
-                )
+            self._db_write(
+                self.videos_collection, 'update_one',
+                {'filename': filename},
+                {'$set': {'status': 'error', 'error_message': str(e)}}
+            )
             
             return {'success': False, 'error': str(e)}
 
 
-    def detect_and_count_pizzas_original(self, video_path, filename, progress_callback=None):
+    def detect_and_count_pizzas_original(self, video_path, filename, progress_callback=None, export=None):
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             raise Exception("Could not open video file")
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        frame_count = 0
-        pizza_count = 0
-        counted_pizzas = set()
-        track_history = defaultdict(lambda: [])
-        all_detections = []
+        # Some containers report no or a negative frame count; progress then stays unknown
+        total_frames = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+        
+        # Optional annotated export, encoded on its own thread
+        writer = None
+        if export:
+            writer = AnnotatedVideoWriter(
+                export['output_path'],
+                fps=cap.get(cv2.CAP_PROP_FPS),
+                frame_size=(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))),
+                output_width=export.get('output_width'),
+                bitrate_kbps=export.get('bitrate_kbps'),
+                queue_size=export.get('queue_size', 64)
+            ).start()
+        recorder = None
+        unsubscribers = []
+        try:
+            # Last tracked boxes, reused on skipped frames of the export
+            last_xyxy, last_ids, last_confs = np.empty((0, 4)), [], []
         
-        print(f"Processing video: {total_frames} frames")
+            # Time-throttled progress events; callbacks only run when one is published
+            channel = get_channel(filename)
+            channel.reset(total_frames)
+            unsubscribers.append(channel.subscribe(lambda snapshot: self._record_progress(filename, snapshot)))
+            if progress_callback:
+                unsubscribers.append(channel.subscribe(lambda snapshot: progress_callback(snapshot['progress'])))
         
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:
-                break
+            # Fresh tracker for this job so tracks never leak between videos or callers
+            session = self.model_pool.session()
+            # Settings are frozen for the whole job; changes apply to the next one
+            settings = self.settings.snapshot()
+            classes_to_detect = list(settings.classes_to_detect)
+        
+            frame_count = 0
+            counting = CountingState.from_settings(settings)
+            all_detections = []
+            # Per-stage latency histograms; PIZZA_STAGE_TIMING=0 turns them off
+            timer = StageTimer()
+            # Counts per time bucket so range queries and charts skip the detections
+            timeline = TimelineBuilder(cap.get(cv2.CAP_PROP_FPS), total_frames)
+            # Every sampled frame's tracks, so thresholds can be retuned without re-inference
+            if RECORD_TRACKS:
+                recorder = TrackRecorder(get_tracks_path(filename), metadata={
+                    'filename': filename,
+                    'confidence_threshold': settings.confidence_threshold,
+                    'frame_skip': settings.frame_skip,
+                    'fps': cap.get(cv2.CAP_PROP_FPS),
+                    'total_frames': total_frames,
+                    'settings_version': settings.version
+                })
+        
+            print(f"Processing video: {total_frames} frames")
+        
+            while cap.isOpened():
+                start = timer.now()
+                success, frame = cap.read()
+                if not success:
+                    break
+                timer.add('decode', start)
             
-            frame_count += 1
+                frame_count += 1
+                start = timer.now()
+                channel.update(frame_count, counting.pizza_count)
+                timer.add('progress', start)
             
-            # Update progress every 10 frames
-            if progress_callback and frame_count % 10 == 0:
-                progress = (frame_count / total_frames) * 100
-                try:
-                    progress_callback(progress)
-                    if filename in self.processing_videos:
-                        self.processing_videos[filename]["progress"] = progress
-                except Exception as e:
-                    print(f"Progress callback error: {e}")
+                # Skip frames for performance
+                if frame_count % settings.frame_skip != 0:
+                    if writer:
+                        start = timer.now()
+                        writer.write(frame, last_xyxy, last_ids, last_confs, counting.pizza_count)
+                        timer.add('export', start)
+                    continue
             
-            # Skip frames for performance
-            if frame_count % self.frame_skip != 0:
-                continue
+                # Model and lease failures fail the job instead of counting zero pizzas
+                tracked = session.track(frame, classes_to_detect, settings.confidence_threshold, timer=timer)
+                try:
+                    if recorder:
+                        start = timer.now()
+                        recorder.add(frame_count, tracked)
+                        timer.add('track_record', start)
+                    pizzas = tracked.filter(
+                        (tracked.classes == self.pizza_class_id) &
+                        (tracked.confidences > settings.confidence_threshold)
+                    )
                 
-            try:
-                results = self.model.track(
-                    frame,
-                    persist=True,
-                    classes=self.classes_to_detect,
-                    conf=self.confidence_threshold,
-                    tracker="bytetrack.yaml"
-                )
+                    if writer:
+                        last_xyxy, last_ids, last_confs = pizzas.xyxy, pizzas.track_ids.tolist(), pizzas.confidences.tolist()
                 
-                if (results[0].boxes is not None and 
-                    results[0].boxes.id is not None and 
-                    len(results[0].boxes.id) > 0):
-                    
-                    boxes = results[0].boxes.xywh.cpu()
-                    track_ids = results[0].boxes.id.int().cpu().tolist()
-                    confidences = results[0].boxes.conf.cpu().tolist()
-                    classes = results[0].boxes.cls.int().cpu().tolist()
-                    
-                    # Process each tracked object
-                    for box, track_id, conf, cls in zip(boxes, track_ids, confidences, classes):
-                        if cls == self.pizza_class_id and conf > self.confidence_threshold:
-                            x, y, w, h = box
-                            center_x, center_y = float(x), float(y)
-                            
-                            # Track pizza movement history
-                            track = track_history[track_id]
-                            track.append((center_x, center_y, frame_count))
-                            
-                            # Keep only recent positions (last 2 seconds)
-                            if len(track) > 60:
-                                track.pop(0)
-                            
-                            # Check if pizza has been "removed" based on movement pattern
-                            if len(track) > 20 and track_id not in counted_pizzas:
-                                if self.is_pizza_removed_original(track):
-                                    counted_pizzas.add(track_id)
-                                    pizza_count += 1
-                                    print(f"Pizza #{pizza_count} detected and counted (Track ID: {track_id})")
-                                    
-                                    # Save detection to database
-                                    detection_data = {
-                                        'track_id': track_id,
-                                        'frame_count': frame_count,
-                                        'confidence': conf,
-                                        'position': {'x': center_x, 'y': center_y},
-                                        'timestamp': datetime.now()
-                                    }
-                                    all_detections.append(detection_data)
-                                    
-                                    if self.db_available:
-                                        self.save_detection_to_db(detection_data, video_path)
-                            
-            except Exception as e:
-                print(f"Error in frame {frame_count}: {e}")
-                continue
-        
-        # Final progress update
-        if progress_callback:
-            progress_callback(100)
+                    # Count pizzas whose movement pattern shows they were removed
+                    start = timer.now()
+                    counted = counting.observe(pizzas, frame_count)
+                    timeline.observe(frame_count, pizzas.track_ids.tolist(), len(counted))
+                    timer.add('counting', start)
+                    for detection_data in counted:
+                        print(f"Pizza #{counting.pizza_count} detected and counted (Track ID: {detection_data['track_id']})")
+                        all_detections.append(detection_data)
+                        start = timer.now()
+                        self.save_detection_to_db(detection_data, video_path)
+                        timer.add('db_write', start)
+                
+                except Exception as e:
+                    print(f"Error in frame {frame_count}: {e}")
+            
+                if writer:
+                    start = timer.now()
+                    writer.write(frame, last_xyxy, last_ids, last_confs, counting.pizza_count)
+                    timer.add('export', start)
+        except Exception:
+            # Never leave an ffmpeg process, a partial export or a half-written track file behind
+            cap.release()
+            if recorder:
+                recorder.abort()
+            if writer:
+                writer.close()
+                if os.path.exists(writer.output_path):
+                    os.remove(writer.output_path)
+            for unsubscribe in unsubscribers:
+                unsubscribe()
+            raise
         
+        resolution = f"{int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}"
         cap.release()
-        print(f"Video processing complete: {pizza_count} pizzas counted")
+        annotated_export = writer.close() if writer else None
+        track_file = recorder.close() if recorder else None
+        
+        # Final progress update
+        channel.finish(counting.pizza_count, frame_count)
+        FRAMES_PROCESSED.inc(frame_count, pipeline='file')
+        PIZZAS_COUNTED.inc(counting.pizza_count, pipeline='file')
+        if annotated_export:
+            self._export_frames_dropped += annotated_export.get('frames_dropped', 0)
+        for unsubscribe in unsubscribers:
+            unsubscribe()
+        print(f"Video processing complete: {counting.pizza_count} pizzas counted")
         
         return {
-            'pizza_count': pizza_count,
+            'pizza_count': counting.pizza_count,
             'total_frames': total_frames,
             'processed_frames': frame_count,
-            'detections': all_detections
-    }
+            'detections': all_detections,
+            'annotated_export': annotated_export,
+            'settings_version': settings.version,
+            'resolution': resolution,
+            'stage_timings': timer.summary(),
+            'track_file': track_file,
+            'timeline': timeline.to_dict(max(total_frames, frame_count))
+        }
 
 
-    def is_pizza_removed_original(self, track):
-        """Determine if pizza has been removed based on MOVEMENT PATTERN"""
-        if len(track) < 20:
-            return False
+    def count_live_source(self, spec, name=None, source=None, commit_interval=LIVE_COMMIT_INTERVAL,
+                          progress_callback=None, base_count=0):
+        """Count pizzas continuously from a camera, stream URL or replay:<file> source.
+
+        Runs until source.stop() is called or a replayed file ends. The running
+        count is upserted into the live_sources collection every commit_interval
+        seconds and each counted pizza is saved as it happens, so a crash loses
+        at most one commit interval of totals. base_count carries a total over
+        from an earlier run of the same source.
+        """
+        name = name or str(spec)
+        source = source or LiveSource(spec)
+        settings = self.settings.snapshot()
+        classes_to_detect = list(settings.classes_to_detect)
         
-        # Get initial and recent positions
-        initial_positions = track[:10]
-        recent_positions = track[-10:]
+        channel = get_channel(name)
+        channel.reset(0)  # unknown length
+        unsubscribe = channel.subscribe(progress_callback) if progress_callback else None
         
-        # Calculate average positions
-        initial_x = np.mean([pos[0] for pos in initial_positions])
-        initial_y = np.mean([pos[1] for pos in initial_positions])
-        recent_x = np.mean([pos[0] for pos in recent_positions])
-        recent_y = np.mean([pos[1] for pos in recent_positions])
+        session = self.model_pool.session()
+        counting = CountingState.from_settings(settings)
+        # Tracks unseen for this many frames are dropped to bound memory
+        max_track_age = settings.track_window * settings.frame_skip
         
-        # Calculate movement distance
-        movement_distance = np.sqrt((recent_x - initial_x)**2 + (recent_y - initial_y)**2)
+        frame_count = 0
+        total = base_count
+        # Metrics are advanced by the delta at each commit, not per frame
+        reported_frames, reported_total = 0, base_count
+        started_at = datetime.now()
+        next_commit = time.monotonic() + commit_interval
+        self._commit_live_count(name, spec, 'live', total, frame_count, source, started_at, settings.version)
+        print(f"📡 Live counting started: {name} ({spec})")
         
-        # Check for significant upward movement (pizza being picked up)
-        vertical_movement = initial_y - recent_y  # Negative Y is up in image coordinates
+        try:
+            while True:
+                frame = source.read()
+                if frame is None:
+                    break
+                
+                frame_count += 1
+                channel.update(frame_count, total)
+                
+                if time.monotonic() >= next_commit:
+                    next_commit = time.monotonic() + commit_interval
+                    counting.prune(frame_count, max_track_age)
+                    FRAMES_PROCESSED.inc(frame_count - reported_frames, pipeline='live')
+                    PIZZAS_COUNTED.inc(total - reported_total, pipeline='live')
+                    reported_frames, reported_total = frame_count, total
+                    self._commit_live_count(name, spec, 'live', total, frame_count, source,
+                                            started_at, settings.version)
+                
+                if frame_count % settings.frame_skip != 0:
+                    continue
+                
+                try:
+                    tracked = session.track(frame, classes_to_detect, settings.confidence_threshold)
+                    pizzas = tracked.filter(
+                        (tracked.classes == self.pizza_class_id) &
+                        (tracked.confidences > settings.confidence_threshold)
+                    )
+                    for detection_data in counting.observe(pizzas, frame_count):
+                        total = base_count + counting.pizza_count
+                        print(f"Pizza #{total} counted on {name} (Track ID: {detection_data['track_id']})")
+                        self.save_detection_to_db(detection_data, str(spec), filename=name)
+                except Exception as e:
+                    print(f"Error in frame {frame_count} of {name}: {e}")
+        finally:
+            # release() stops the source, so decide how the session ended first
+            status = 'stopped' if source.stopped else 'ended'
+            source.release()
+            FRAMES_PROCESSED.inc(frame_count - reported_frames, pipeline='live')
+            PIZZAS_COUNTED.inc(total - reported_total, pipeline='live')
+            self._commit_live_count(name, spec, status, total, frame_count, source,
+                                    started_at, settings.version)
+            channel.finish(total, frame_count, status='completed')
+            if unsubscribe:
+                unsubscribe()
+            print(f"📡 Live counting {status}: {name}, {total} pizzas")
         
-        # Pizza is considered "removed" if:
-        # 1. Significant overall movement
-        # 2. Upward movement (being picked up)
-        # 3. Movement exceeds threshold
-        return (movement_distance > self.movement_threshold and
-                vertical_movement > 30 and
-                movement_distance > 50)
+        return {
+            'success': True,
+            'pizza_count': total,
+            'processed_frames': frame_count,
+            'reconnects': source.reconnects
+        }
 
-    def save_detection_to_db(self, detection_data, video_path):
-        """Save detection to MongoDB"""
-        if not self.db_available:
-            return
-        
+    def _commit_live_count(self, name, spec, status, pizza_count, frame_count, source, started_at, settings_version):
+        """Upsert the running totals for a live source"""
+        self._db_write(
+            self.live_sources_collection, 'update_one',
+            {'name': name},
+            {'$set': {
+                'source': str(spec),
+                'status': status,
+                'pizza_count': pizza_count,
+                'processed_frames': frame_count,
+                'connected': source.connected,
+                'reconnects': source.reconnects,
+                'last_error': source.last_error,
+                'started_at': started_at,
+                'updated_at': datetime.now(),
+                'settings_version': settings_version
+            }},
+            upsert=True
+        )
+
+    def _record_progress(self, filename, snapshot):
+        """Mirror published progress into processing_videos"""
+        if filename in self.processing_videos:
+            self.processing_videos[filename]['progress'] = snapshot['progress']
+
+    def is_pizza_removed_original(self, track, movement_threshold=None):
+        """Determine if pizza has been removed based on MOVEMENT PATTERN"""
+        if movement_threshold is None:
+            movement_threshold = self.movement_threshold
+        return is_pizza_removed(track, movement_threshold)
+
+    def save_detection_to_db(self, detection_data, video_path, filename=None):
+        """Save detection to MongoDB, buffering it while the server is down"""
         try:
             detection_record = {
                 'video_path': video_path,
-                'filename': os.path.basename(video_path),
+                'filename': filename or os.path.basename(video_path),
                 'track_id': detection_data['track_id'],
                 'frame_count': detection_data['frame_count'],
                 'confidence': detection_data['confidence'],
@@ -362,41 +863,47 @@ class PizzaCounter:
                 'class_id': self.pizza_class_id,
                 'class_name': 'pizza'
             }
-            self.detections_collection.insert_one(detection_record)
+            self._db_write(self.detections_collection, 'insert_one', detection_record)
+            self.rollups.record_detection(detection_record['timestamp'], detection_record['confidence'])
         except Exception as e:
             print(f"Error saving detection: {e}")
 
-    def process_frame_for_stream(self, frame):
+    def process_frame_for_stream(self, frame, annotate=True, show_confidence=True):
         """Process single frame for real-time streaming"""
+        if not self.model_ready:
+            return {'error': 'Model is still loading'}
+        
         try:
-            results = self.model(
+            # Shares micro-batches with running jobs and live sources
+            boxes = self.model_pool.inference.predict(
                 frame,
                 classes=self.classes_to_detect,
                 conf=self.confidence_threshold
             )
             
             detections = []
-            annotated_frame = frame.copy()
-            
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        conf = float(box.conf[0])
-                        cls = int(box.cls[0])
-                        if cls == self.pizza_class_id and conf >= self.confidence_threshold:
-                            x1, y1, x2, y2 = box.xyxy[0].tolist()
-                            
-                            # Draw bounding box
-                            cv2.rectangle(annotated_frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                            cv2.putText(annotated_frame, f'Pizza: {conf:.2f}', (int(x1), int(y1) - 10),
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                            
-                            detections.append({
-                                'confidence': conf,
-                                'bbox': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2},
-                                'class_name': 'pizza'
-                            })
+            # Only pay for a frame copy when boxes are drawn
+            annotated_frame = frame.copy() if annotate else frame
+            
+            if len(boxes) > 0:
+                # Move everything to NumPy once and filter with masks
+                xyxy = boxes.xyxy.numpy()
+                confidences = boxes.conf.numpy()
+                classes = boxes.cls.numpy().astype(int)
+                mask = (classes == self.pizza_class_id) & (confidences >= self.confidence_threshold)
+                xyxy = xyxy[mask]
+                confidences = confidences[mask]
+                
+                for (x1, y1, x2, y2), conf in zip(xyxy.tolist(), confidences.tolist()):
+                    detections.append({
+                        'confidence': conf,
+                        'bbox': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2},
+                        'class_name': 'pizza'
+                    })
+                
+                if annotate:
+                    labels = [f'Pizza: {conf:.2f}' for conf in confidences.tolist()] if show_confidence else None
+                    draw_detection_boxes(annotated_frame, xyxy, labels)
             
             return {
                 'frame': annotated_frame,
@@ -443,10 +950,10 @@ class PizzaCounter:
             avg_conf_result = list(self.detections_collection.aggregate(pipeline))
             avg_confidence = avg_conf_result[0]['avg_confidence'] if avg_conf_result else 0
             
-            # Model accuracy (based on feedback)
-            total_feedback = self.feedback_collection.count_documents({})
-            positive_feedback = self.feedback_collection.count_documents({'feedback_type': 'correct'})
-            accuracy_percentage = (positive_feedback / total_feedback * 100) if total_feedback > 0 else 0
+            # Model accuracy from the running feedback counters
+            feedback = self.feedback_counters.overall()
+            total_feedback = feedback['total']
+            accuracy_percentage = feedback['accuracy']
             
             # Currently processing count
             currently_processing = len([v for v in self.processing_videos.values() if v['status'] == 'processing'])
@@ -490,7 +997,8 @@ class PizzaCounter:
                     return self.processing_videos[filename]
                 return {'status': 'not_found'}
             
-            video_doc = self.videos_collection.find_one({'filename': filename})
+            # The timeline is loaded separately by get_video_timeline
+            video_doc = self.videos_collection.find_one({'filename': filename}, {'timeline': 0})
             if video_doc:
                 video_doc['_id'] = str(video_doc['_id'])
                 return video_doc
@@ -502,30 +1010,166 @@ class PizzaCounter:
         except Exception as e:
             return {'error': str(e)}
 
+    def get_video_timeline(self, filename):
+        """Per-bucket count timeline stored with a processed video, or None"""
+        if not self.db_available:
+            return None
+        
+        try:
+            video_doc = self.videos_collection.find_one({'filename': filename}, {'timeline': 1})
+            return video_doc.get('timeline') if video_doc else None
+        except Exception as e:
+            print(f"Error loading timeline: {e}")
+            return None
+
+    def count_video_range(self, filename, start=None, end=None):
+        """Pizzas counted in a video between two offsets (seconds), read from its timeline"""
+        timeline = self.get_video_timeline(filename)
+        if timeline is None:
+            return None
+        return count_in_range(timeline, start, end)
+
+    def find_video_by_hash(self, content_hash):
+        """Earlier upload with identical content that is queued, processing or done, or None"""
+        if not self.db_available or not content_hash:
+            return None
+        try:
+            return self.videos_collection.find_one(
+                {'content_hash': content_hash, 'status': {'$in': list(DUPLICATE_UPLOAD_STATUSES)}},
+                {'filename': 1, 'status': 1, 'pizza_count': 1}
+            )
+        except Exception as e:
+            print(f"Error looking up video hash: {e}")
+            return None
+
+    def register_upload(self, filename, file_path, upload_info):
+        """Record a saved upload with its content hash before it is processed"""
+        self._db_write(
+            self.videos_collection, 'update_one',
+            {'filename': filename},
+            {'$set': {
+                'content_hash': upload_info['content_hash'],
+                'file_size': upload_info['size'],
+                'container': upload_info['container']
+            },
+             '$setOnInsert': {
+                'file_path': file_path,
+                'status': 'pending',
+                'uploaded_at': datetime.now()
+            }},
+            upsert=True
+        )
+
+    def recount_video(self, filename, save=False, **overrides):
+        """Recount a processed video from its recorded tracks, without re-running YOLO.
+
+        Uses the current settings; keyword overrides (movement_threshold,
+        confidence_threshold, vertical_threshold, min_track_length,
+        track_window) replace individual values.
+        """
+        track_path = get_tracks_path(filename)
+        if not os.path.exists(track_path):
+            return {'success': False, 'error': 'No recorded tracks for this video; process it again to record them'}
+        
+        settings = self.settings.snapshot()._replace(**overrides)
+        try:
+            columns, metadata = load_tracks(track_path)
+            # Boxes below the recording threshold were never detected
+            recorded_confidence = metadata.get('confidence_threshold', 0)
+            timeline = TimelineBuilder(metadata.get('fps'), metadata.get('total_frames', 0))
+            result = recount_tracks(
+                columns,
+                CountingState.from_settings(settings),
+                max(settings.confidence_threshold, recorded_confidence),
+                class_id=self.pizza_class_id,
+                timeline=timeline
+            )
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        
+        recount = {
+            'pizza_count': result['pizza_count'],
+            'movement_threshold': settings.movement_threshold,
+            'confidence_threshold': settings.confidence_threshold,
+            'vertical_threshold': settings.vertical_threshold,
+            'min_track_length': settings.min_track_length,
+            'track_window': settings.track_window,
+            'recorded_confidence_threshold': recorded_confidence,
+            'seconds': result['seconds'],
+            'recounted_at': datetime.now()
+        }
+        if save:
+            self._db_write(
+                self.videos_collection, 'update_one',
+                {'filename': filename},
+                {'$set': {
+                    'pizza_count': result['pizza_count'],
+                    'last_recount': recount,
+                    'timeline': timeline.to_dict(metadata.get('total_frames'))
+                }}
+            )
+        return dict(recount, success=True, detections=result['detections'])
+
+    def get_track_labels(self, filename):
+        """Feedback on a video's counted detections as {track_id: True (correct) / False (incorrect)}"""
+        if not self.db_available:
+            return {}
+
+        try:
+            detections = {
+                str(doc['_id']): doc['track_id']
+                for doc in self.detections_collection.find({'filename': filename}, {'track_id': 1})
+            }
+            if not detections:
+                return {}
+            labels = {}
+            for feedback in self.feedback_collection.find(
+                {'detection_id': {'$in': list(detections)}}
+            ).sort('timestamp', 1):
+                # Latest feedback on a detection wins
+                labels[int(detections[feedback['detection_id']])] = feedback['feedback_type'] == 'correct'
+            return labels
+        except Exception as e:
+            print(f"Error loading feedback labels: {e}")
+            return {}
+
+    def sweep_video(self, filename, grid=None):
+        """Count a video under every combination of a parameter grid from its recorded tracks"""
+        track_path = get_tracks_path(filename)
+        if not os.path.exists(track_path):
+            return {'success': False, 'error': 'No recorded tracks for this video; process it again to record them'}
+
+        try:
+            columns, metadata = load_tracks(track_path)
+            grid = dict(DEFAULT_SWEEP_GRID, **(grid or {}))
+            # Boxes below the recording threshold were never detected
+            recorded_confidence = metadata.get('confidence_threshold', 0)
+            grid['confidence_threshold'] = sorted({max(c, recorded_confidence) for c in grid['confidence_threshold']})
+            labels = self.get_track_labels(filename)
+            result = sweep_tracks(columns, grid, class_id=self.pizza_class_id, labels=labels)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+        return dict(result, success=True, filename=filename, labels=len(labels),
+                    recorded_confidence_threshold=recorded_confidence)
+
     def get_model_settings(self):
         """Get current model settings"""
+        snapshot = self.settings.snapshot()
         return {
-            'confidence_threshold': self.confidence_threshold,
-            'tracking_threshold': self.tracking_threshold,
-            'movement_threshold': self.movement_threshold,
-            'frame_skip': self.frame_skip
+            'confidence_threshold': snapshot.confidence_threshold,
+            'tracking_threshold': snapshot.tracking_threshold,
+            'movement_threshold': snapshot.movement_threshold,
+            'frame_skip': snapshot.frame_skip,
+            'vertical_threshold': snapshot.vertical_threshold,
+            'min_track_length': snapshot.min_track_length,
+            'track_window': snapshot.track_window,
+            'version': snapshot.version
         }
 
     def update_confidence_threshold(self, threshold):
-        """Update confidence threshold"""
-        self.confidence_threshold = threshold
-        if self.db_available:
-            try:
-                settings_data = {
-                    'confidence_threshold': threshold,
-                    'tracking_threshold': self.tracking_threshold,
-                    'movement_threshold': self.movement_threshold,
-                    'frame_skip': self.frame_skip,
-                    'created_at': datetime.now()
-                }
-                self.settings_collection.insert_one(settings_data)
-            except Exception as e:
-                print(f"Error updating settings: {e}")
+        """Update confidence threshold; persisted after the debounce window"""
+        return self.settings.update(confidence_threshold=threshold)
 
     def get_analytics_data(self, start_date, end_date):
         """Get analytics data for specified date range"""
@@ -537,58 +1181,26 @@ class PizzaCounter:
                     'confidence_distribution': [],
                     'avg_confidence': 0,
                     'videos_processed': 0,
-                    'model_accuracy': 0,
-                    'detection_log': []
+                    'model_accuracy': 0
                 }
             
             start_datetime = datetime.combine(start_date, datetime.min.time())
             end_datetime = datetime.combine(end_date, datetime.max.time())
             
-            # Total detections in range
-            total_detections = self.detections_collection.count_documents({
-                'timestamp': {'$gte': start_datetime, '$lte': end_datetime}
-            })
-            
-            # Daily detection counts
-            daily_pipeline = [
-                {'$match': {'timestamp': {'$gte': start_datetime, '$lte': end_datetime}}},
-                {'$group': {
-                    '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp'}},
-                    'count': {'$sum': 1}
-                }},
-                {'$sort': {'_id': 1}}
+            # Everything except the log comes from daily rollups: one small
+            # document per day however many detections there were
+            daily_rollups = self.rollups.query(start_datetime, end_datetime)
+            summary = self.rollups.summarize(daily_rollups)
+            daily_data = [{'date': doc['_id'].strftime('%Y-%m-%d'), 'count': doc.get('detections', 0)}
+                          for doc in daily_rollups if doc.get('detections')]
+            confidence_data = [
+                {'confidence': (index + 0.5) / CONFIDENCE_BINS, 'count': count}
+                for index, count in enumerate(summary['confidence_bins']) if count
             ]
-            daily_detections = list(self.detections_collection.aggregate(daily_pipeline))
-            daily_data = [{'date': item['_id'], 'count': item['count']} for item in daily_detections]
-            
-            # Confidence distribution
-            confidence_data = list(self.detections_collection.find(
-                {'timestamp': {'$gte': start_datetime, '$lte': end_datetime}},
-                {'confidence': 1}
-            ))
-            
-            # Average confidence
-            avg_confidence = sum(item['confidence'] for item in confidence_data) / len(confidence_data) if confidence_data else 0
-            
-            # Videos processed in range
-            videos_processed = self.videos_collection.count_documents({
-                'processed_at': {'$gte': start_datetime, '$lte': end_datetime}
-            })
-            
-            # Model accuracy
-            total_feedback = self.feedback_collection.count_documents({
-                'timestamp': {'$gte': start_datetime, '$lte': end_datetime}
-            })
-            positive_feedback = self.feedback_collection.count_documents({
-                'timestamp': {'$gte': start_datetime, '$lte': end_datetime},
-                'feedback_type': 'correct'
-            })
-            model_accuracy = (positive_feedback / total_feedback * 100) if total_feedback > 0 else 0
-            
-            # Detailed detection log
-            detection_log = list(self.detections_collection.find({
-                'timestamp': {'$gte': start_datetime, '$lte': end_datetime}
-            }).sort('timestamp', -1).limit(100))
+            total_detections = summary['detections']
+            avg_confidence = summary['avg_confidence']
+            videos_processed = summary['videos_processed']
+            model_accuracy = round(summary['model_accuracy'], 1)
             
             return {
                 'total_detections': total_detections,
@@ -596,13 +1208,104 @@ class PizzaCounter:
                 'confidence_distribution': confidence_data,
                 'avg_confidence': avg_confidence,
                 'videos_processed': videos_processed,
-                'model_accuracy': model_accuracy,
-                'detection_log': detection_log
+                'model_accuracy': model_accuracy
             }
             
         except Exception as e:
             return {'error': str(e)}
 
+    def get_detection_page(self, start_date, end_date, after=None, page_size=DETECTION_PAGE_SIZE):
+        """One page of detections in the date range, newest first, by keyset pagination.
+
+        after is the previous page's next_cursor, the (timestamp, _id) of its
+        last row. The query seeks to it on the (timestamp, _id) index rather
+        than skipping rows, so deep pages cost the same as the first.
+        """
+        if not self.db_available:
+            return {'detections': [], 'next_cursor': None}
+        
+        try:
+            query = {'timestamp': {
+                '$gte': datetime.combine(start_date, datetime.min.time()),
+                '$lte': datetime.combine(end_date, datetime.max.time())
+            }}
+            if after is not None:
+                query = {'$and': [query, {'$or': [
+                    {'timestamp': {'$lt': after['timestamp']}},
+                    {'timestamp': after['timestamp'], '_id': {'$lt': after['_id']}}
+                ]}]}
+            
+            # One extra row tells whether another page exists
+            detections = list(self.detections_collection.find(query, {'video_path': 0})
+                              .sort([('timestamp', -1), ('_id', -1)])
+                              .limit(page_size + 1))
+            next_cursor = None
+            if len(detections) > page_size:
+                detections = detections[:page_size]
+                last = detections[-1]
+                next_cursor = {'timestamp': last['timestamp'], '_id': last['_id']}
+            return {'detections': detections, 'next_cursor': next_cursor}
+        except Exception as e:
+            return {'detections': [], 'next_cursor': None, 'error': str(e)}
+
+    def export_detections(self, start_date, end_date, fmt='csv'):
+        """Write every detection in the date range to a temporary CSV or Parquet file"""
+        if not self.db_available:
+            return {'success': False, 'error': 'Database not available'}
+        
+        try:
+            query = {'timestamp': {
+                '$gte': datetime.combine(start_date, datetime.min.time()),
+                '$lte': datetime.combine(end_date, datetime.max.time())
+            }}
+            return dict(export_detections(self.detections_collection, query, fmt), success=True)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def rebuild_rollups(self):
+        """Recompute the hourly/daily rollups and feedback counters from all detections, videos and feedback"""
+        if not self.db_available:
+            return {'success': False, 'error': 'Database not available'}
+        
+        try:
+            result = self.rollups.rebuild(self.detections_collection, self.videos_collection, self.feedback_collection)
+            result['feedback'] = self.feedback_counters.rebuild(self.feedback_collection, self.detections_collection.name)
+            return dict(result, success=True)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def _backfill_rollups_if_empty(self):
+        """Build rollups and feedback counters in the background the first time an existing database is opened"""
+        try:
+            rollups_missing = (self.rollups_daily_collection.find_one({}, {'_id': 1}) is None and
+                               self.detections_collection.find_one({}, {'_id': 1}) is not None)
+            counters_missing = (self.feedback_counters_collection.find_one({}, {'_id': 1}) is None and
+                                self.feedback_collection.find_one({}, {'_id': 1}) is not None)
+            if not rollups_missing and not counters_missing:
+                return
+        except Exception as e:
+            print(f"⚠️ Rollup check failed: {e}")
+            return
+        
+        def run():
+            result = self.rebuild_rollups()
+            print(f"📊 Analytics rollups backfilled: {result}")
+        
+        threading.Thread(target=run, name="rollup-backfill", daemon=True).start()
+
+    def delete_video_records(self, filename):
+        """Delete a video's document and detections, taking them out of the rollups first"""
+        if not self.db_available:
+            return False
+        
+        match = {'filename': filename}
+        self.rollups.subtract_detections(self.detections_collection, match)
+        video = self.videos_collection.find_one_and_delete(match, projection={'status': 1, 'processed_at': 1})
+        if video and video.get('status') == 'completed' and video.get('processed_at'):
+            self.rollups.record(video['processed_at'], videos_processed=-1)
+        self.detections_collection.delete_many(match)
+        return True
+
     def get_processing_status(self, filename):
         """Get processing status for a specific video"""
         if filename in self.processing_videos:
@@ -618,3 +1321,150 @@ class PizzaCounter:
                 }
         
         return {'status': 'not_found'}
+
+
+def collect_video_files(paths):
+    """Expand files and directories into a sorted list of supported video files"""
+    from utils.helpers import allowed_file
+    
+    video_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                file_path = os.path.join(path, name)
+                if os.path.isfile(file_path) and allowed_file(name):
+                    video_files.append(file_path)
+        elif os.path.isfile(path) and allowed_file(path):
+            video_files.append(path)
+        else:
+            print(f"⚠️ Skipping {path}: not a supported video file or directory")
+    return video_files
+
+def run_batch(counter, video_files, workers=1, export_annotated=False, progress_interval=10):
+    """Process video files in parallel and print per-file throughput"""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    def process_one(video_path):
+        name = os.path.basename(video_path)
+        last_print = [0.0]
+        
+        def print_progress(snapshot):
+            # Channel events are already throttled; the CLI prints even less often
+            if snapshot['status'] == 'processing' and time.time() - last_print[0] >= progress_interval:
+                last_print[0] = time.time()
+                eta = f"{snapshot['eta_seconds']:.0f}s" if snapshot['eta_seconds'] is not None else "?"
+                print(f"   {name}: {snapshot['progress']:.1f}% | {snapshot['fps']:.1f} fps | "
+                      f"ETA {eta} | {snapshot['pizza_count']} pizzas")
+        
+        unsubscribe = get_channel(name).subscribe(print_progress)
+        start = time.time()
+        try:
+            result = counter.process_video(video_path, name, export_annotated=export_annotated)
+        finally:
+            unsubscribe()
+        return video_path, result, time.time() - start
+    
+    failures = 0
+    total_frames = 0
+    total_pizzas = 0
+    batch_start = time.time()
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(process_one, video_path) for video_path in video_files]
+        for future in as_completed(futures):
+            video_path, result, elapsed = future.result()
+            name = os.path.basename(video_path)
+            if result.get('success'):
+                frames = result.get('total_frames', 0)
+                fps = frames / elapsed if elapsed > 0 else 0
+                total_frames += frames
+                total_pizzas += result.get('pizza_count', 0)
+                print(f"✅ {name}: {result['pizza_count']} pizzas | {frames} frames in {elapsed:.1f}s ({fps:.1f} fps)")
+            else:
+                failures += 1
+                print(f"❌ {name}: {result.get('error', 'Processing failed')} ({elapsed:.1f}s)")
+    
+    elapsed = time.time() - batch_start
+    print(f"Processed {len(video_files) - failures}/{len(video_files)} videos | "
+          f"{total_pizzas} pizzas | {total_frames} frames in {elapsed:.1f}s "
+          f"({total_frames / elapsed if elapsed > 0 else 0:.1f} fps)")
+    return failures
+
+def main(argv=None):
+    """Headless entry point: python -m utils.pizza_counter process <files|dir> | live <source> | rebuild-rollups | dedupe-feedback"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="python -m utils.pizza_counter", description="Headless pizza counting")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    process_parser = subparsers.add_parser("process", help="Process video files or directories")
+    process_parser.add_argument("paths", nargs="+", help="Video files or directories of videos")
+    process_parser.add_argument("--workers", type=int, default=1, help="Videos processed in parallel")
+    process_parser.add_argument("--model", default="./models/yolo11n.pt", help="YOLO model path")
+    process_parser.add_argument("--export-annotated", action="store_true", help="Also write annotated MP4s")
+    
+    live_parser = subparsers.add_parser("live", help="Count continuously from a camera or stream")
+    live_parser.add_argument("source", help="Device index, http(s)/rtsp URL, or replay:<file> for real-time file replay")
+    live_parser.add_argument("--name", help="Name the counts are stored under (defaults to the source)")
+    live_parser.add_argument("--loop", action="store_true", help="Restart replay:<file> sources at the end")
+    live_parser.add_argument("--model", default="./models/yolo11n.pt", help="YOLO model path")
+    
+    subparsers.add_parser("rebuild-rollups", help="Recompute hourly/daily analytics rollups from history")
+    subparsers.add_parser("dedupe-feedback", help="Archive superseded feedback and make it unique per detection")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "process":
+        video_files = collect_video_files(args.paths)
+        if not video_files:
+            print("No video files to process")
+            return 2
+        
+        # MONGODB_URI comes from the environment; queue workers stay off so
+        # the CLI does not drain jobs submitted through the UI
+        counter = PizzaCounter(model_path=args.model, start_job_workers=False)
+        failures = run_batch(counter, video_files, workers=args.workers, export_annotated=args.export_annotated)
+        return 1 if failures else 0
+    
+    if args.command == "rebuild-rollups":
+        counter = PizzaCounter(start_job_workers=False)
+        result = counter.rebuild_rollups()
+        if not result['success']:
+            print(f"❌ {result['error']}")
+            return 1
+        print(f"✅ Rebuilt {result['hours']} hourly and {result['days']} daily rollups in {result['seconds']:.1f}s")
+        return 0
+    
+    if args.command == "dedupe-feedback":
+        counter = PizzaCounter(start_job_workers=False)
+        result = counter.dedupe_feedback()
+        if not result['success']:
+            print(f"❌ {result['error']}")
+            return 1
+        print(f"✅ Archived {result['archived']} superseded feedback document(s)")
+        return 0
+    
+    if args.command == "live":
+        counter = PizzaCounter(model_path=args.model, start_job_workers=False)
+        source = LiveSource(args.source, loop_replay=args.loop)
+        result = {}
+        
+        def run():
+            result.update(counter.count_live_source(args.source, name=args.name, source=source))
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            while worker.is_alive():
+                worker.join(0.5)
+        except KeyboardInterrupt:
+            print("Stopping...")
+            source.stop()
+            worker.join()
+        return 0 if result.get('success') else 1
+    
+    return 2
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import threading
+import time
+
+# Minimum seconds between published progress events per channel
+DEFAULT_PUBLISH_INTERVAL = 0.5
+
+# Channels keyed by video filename (or any job key)
+_channels = {}
+_channels_lock = threading.Lock()
+
+class ProgressChannel:
+    """Time-throttled progress events for one processing job.
+
+    The processing loop calls update() every frame; it costs a clock read and
+    a comparison, and subscribers only run when an event is published. UI
+    sessions can poll snapshot() instead of subscribing.
+    """
+
+    def __init__(self, key, min_interval=DEFAULT_PUBLISH_INTERVAL):
+        self.key = key
+        self.min_interval = min_interval
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, total_frames=0):
+        """Start a new run, keeping subscribers"""
+        self.total_frames = total_frames
+        self._start = time.monotonic()
+        self._next_publish = 0
+        self._snapshot = {
+            'key': self.key,
+            'status': 'processing',
+            'progress': 0.0,
+            'frame_count': 0,
+            'total_frames': total_frames,
+            'fps': 0.0,
+            'eta_seconds': None,
+            'pizza_count': 0,
+            'elapsed_seconds': 0.0,
+            'error': None
+        }
+
+    def update(self, frame_count, pizza_count):
+        """Called from the hot loop; publishes at most once per min_interval"""
+        now = time.monotonic()
+        if now < self._next_publish:
+            return
+        self._next_publish = now + self.min_interval
+        self._publish('processing', frame_count, pizza_count, now)
+
+    def finish(self, pizza_count, frame_count=None, status='completed', error=None):
+        """Always publish the final event"""
+        if frame_count is None:
+            frame_count = self._snapshot['frame_count']
+        self._publish(status, frame_count, pizza_count, time.monotonic(), error)
+
+    def snapshot(self):
+        return dict(self._snapshot)
+
+    def subscribe(self, callback):
+        """Register callback(snapshot); returns a function that unsubscribes it"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def _publish(self, status, frame_count, pizza_count, now, error=None):
+        elapsed = now - self._start
+        fps = frame_count / elapsed if elapsed > 0 else 0.0
+
+        if status == 'completed':
+            progress = 100.0
+        elif self.total_frames > 0:
+            progress = min(frame_count / self.total_frames * 100, 100.0)
+        else:
+            progress = 0.0
+
+        eta = None
+        if status == 'processing' and self.total_frames > 0 and fps > 0:
+            eta = max(self.total_frames - frame_count, 0) / fps
+
+        self._snapshot = {
+            'key': self.key,
+            'status': status,
+            'progress': progress,
+            'frame_count': frame_count,
+            'total_frames': self.total_frames,
+            'fps': fps,
+            'eta_seconds': eta,
+            'pizza_count': pizza_count,
+            'elapsed_seconds': elapsed,
+            'error': error
+        }
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(self._snapshot)
+            except Exception as e:
+                print(f"Progress subscriber error: {e}")
+
+def get_channel(key):
+    """Get or create the progress channel for a key"""
+    with _channels_lock:
+        channel = _channels.get(key)
+        if channel is None:
+            channel = ProgressChannel(key)
+            _channels[key] = channel
+        return channel
+
+def find_channel(key):
+    """Get an existing channel without creating one"""
+    with _channels_lock:
+        return _channels.get(key)
+
+def release_channel(key):
+    """Drop a finished channel"""
+    with _channels_lock:
+        _channels.pop(key, None)
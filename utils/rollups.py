@@ -0,0 +1,198 @@
+import threading
+import time
+from datetime import datetime
+
+# Confidence histogram resolution kept in every rollup document
+CONFIDENCE_BINS = 20
+ROLLUP_HOUR = 'hour'
+ROLLUP_DAY = 'day'
+ROLLUP_FIELDS = ('detections', 'confidence_sum', 'videos_processed', 'feedback_total', 'feedback_correct')
+
+def period_start(timestamp, period):
+    """Start of the hour or day containing timestamp (the rollup _id)"""
+    if period == ROLLUP_HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def confidence_bin(confidence):
+    return min(CONFIDENCE_BINS - 1, max(0, int(confidence * CONFIDENCE_BINS)))
+
+def _hour_expression(field):
+    # $dateFromParts rather than $dateTrunc so MongoDB 3.6+ works
+    return {'$dateFromParts': {
+        'year': {'$year': field},
+        'month': {'$month': field},
+        'day': {'$dayOfMonth': field},
+        'hour': {'$hour': field}
+    }}
+
+def replace_collection(collection, docs):
+    """Swap collection's contents for docs without readers ever seeing it empty.
+
+    docs go into a side collection that is renamed over the target, which
+    MongoDB does atomically.
+    """
+    if not docs:
+        collection.delete_many({})
+        return
+    staging = collection.database[f"{collection.name}_rebuild"]
+    staging.drop()
+    staging.insert_many(docs, ordered=False)
+    staging.rename(collection.name, dropTarget=True)
+
+def _merge(target, key, increments):
+    doc = target.setdefault(key, {'_id': key})
+    for field, value in increments.items():
+        if field == 'confidence_bins':
+            bins = doc.setdefault('confidence_bins', {})
+            for index, count in value.items():
+                bins[index] = bins.get(index, 0) + count
+        else:
+            doc[field] = doc.get(field, 0) + value
+
+class RollupStore:
+    """Hourly and daily analytics totals, updated with $inc as data is written.
+
+    Each document is keyed by the start of its hour or day and holds
+    detections, a confidence sum and histogram, videos processed and
+    feedback totals. Analytics sums a few hundred of these instead of
+    scanning detections. rebuild() recomputes both collections from history;
+    record() waits while it runs so no $inc lands on a collection about to
+    be replaced.
+    """
+
+    def __init__(self, hourly_collection, daily_collection, db_write):
+        self.collections = {ROLLUP_HOUR: hourly_collection, ROLLUP_DAY: daily_collection}
+        self._db_write = db_write
+        self._rebuild_lock = threading.Lock()
+
+    def record(self, timestamp, **increments):
+        """Add increments (ROLLUP_FIELDS or confidence_bins={bin: n}) to the hour and day of timestamp"""
+        inc = {}
+        for field, value in increments.items():
+            if field == 'confidence_bins':
+                for index, count in value.items():
+                    inc[f'confidence_bins.{index}'] = count
+            elif value:
+                inc[field] = value
+        if not inc:
+            return
+        with self._rebuild_lock:
+            for period, collection in self.collections.items():
+                if collection is None:
+                    continue
+                self._db_write(collection, 'update_one', {'_id': period_start(timestamp, period)}, {'$inc': inc}, upsert=True)
+
+    def record_detection(self, timestamp, confidence):
+        self.record(timestamp, detections=1, confidence_sum=confidence,
+                    confidence_bins={str(confidence_bin(confidence)): 1})
+
+    def record_video(self, timestamp):
+        self.record(timestamp, videos_processed=1)
+
+    def record_feedback(self, timestamp, correct, count=1):
+        self.record(timestamp, feedback_total=count, feedback_correct=count if correct else 0)
+
+    def query(self, start, end, period=ROLLUP_DAY):
+        """Rollup documents whose period starts within [start, end], oldest first"""
+        collection = self.collections[period]
+        return list(collection.find({
+            '_id': {'$gte': period_start(start, period), '$lte': end}
+        }).sort('_id', 1))
+
+    @staticmethod
+    def summarize(docs):
+        """Totals, averages and the confidence histogram over rollup documents"""
+        totals = {field: 0 for field in ROLLUP_FIELDS}
+        bins = [0] * CONFIDENCE_BINS
+        for doc in docs:
+            for field in ROLLUP_FIELDS:
+                totals[field] += doc.get(field, 0)
+            for index, count in (doc.get('confidence_bins') or {}).items():
+                bins[int(index)] += count
+        detections = totals['detections']
+        feedback_total = totals['feedback_total']
+        return dict(
+            totals,
+            avg_confidence=totals['confidence_sum'] / detections if detections else 0,
+            model_accuracy=totals['feedback_correct'] / feedback_total * 100 if feedback_total else 0,
+            confidence_bins=bins
+        )
+
+    def hourly_detection_increments(self, detections_collection, match=None):
+        """{hour: increments} for detections matching match, aggregated server side"""
+        pipeline = [
+            {'$match': match or {}},
+            {'$group': {
+                '_id': {
+                    'hour': _hour_expression('$timestamp'),
+                    'bin': {'$min': [CONFIDENCE_BINS - 1,
+                                     {'$floor': {'$multiply': [{'$ifNull': ['$confidence', 0]}, CONFIDENCE_BINS]}}]}
+                },
+                'detections': {'$sum': 1},
+                'confidence_sum': {'$sum': '$confidence'}
+            }}
+        ]
+        hours = {}
+        for row in detections_collection.aggregate(pipeline, allowDiskUse=True):
+            _merge(hours, row['_id']['hour'], {
+                'detections': row['detections'],
+                'confidence_sum': row['confidence_sum'],
+                'confidence_bins': {str(int(row['_id']['bin'])): row['detections']}
+            })
+        return hours
+
+    def rebuild(self, detections_collection, videos_collection, feedback_collection):
+        """Recompute every rollup from detections, videos and feedback. Returns a summary."""
+        with self._rebuild_lock:
+            return self._rebuild(detections_collection, videos_collection, feedback_collection)
+
+    def _rebuild(self, detections_collection, videos_collection, feedback_collection):
+        start = time.perf_counter()
+        hours = self.hourly_detection_increments(detections_collection)
+
+        for row in videos_collection.aggregate([
+            {'$match': {'status': 'completed', 'processed_at': {'$type': 'date'}}},
+            {'$group': {'_id': _hour_expression('$processed_at'), 'videos': {'$sum': 1}}}
+        ], allowDiskUse=True):
+            _merge(hours, row['_id'], {'videos_processed': row['videos']})
+
+        for row in feedback_collection.aggregate([
+            {'$match': {'timestamp': {'$type': 'date'}}},
+            # Only the latest feedback per detection counts
+            {'$sort': {'timestamp': 1}},
+            {'$group': {
+                '_id': '$detection_id',
+                'timestamp': {'$last': '$timestamp'},
+                'feedback_type': {'$last': '$feedback_type'}
+            }},
+            {'$group': {
+                '_id': _hour_expression('$timestamp'),
+                'total': {'$sum': 1},
+                'correct': {'$sum': {'$cond': [{'$eq': ['$feedback_type', 'correct']}, 1, 0]}}
+            }}
+        ], allowDiskUse=True):
+            _merge(hours, row['_id'], {'feedback_total': row['total'], 'feedback_correct': row['correct']})
+
+        days = {}
+        for hour, doc in hours.items():
+            _merge(days, period_start(hour, ROLLUP_DAY), {k: v for k, v in doc.items() if k != '_id'})
+
+        for period, docs in ((ROLLUP_HOUR, hours), (ROLLUP_DAY, days)):
+            replace_collection(self.collections[period], sorted(docs.values(), key=lambda doc: doc['_id']))
+
+        return {
+            'hours': len(hours),
+            'days': len(days),
+            'seconds': round(time.perf_counter() - start, 2),
+            'rebuilt_at': datetime.now()
+        }
+
+    def subtract_detections(self, detections_collection, match):
+        """Take detections matching match back out of the rollups, before they are deleted"""
+        for hour, increments in self.hourly_detection_increments(detections_collection, match).items():
+            increments.pop('_id')
+            self.record(hour, **{
+                field: ({index: -count for index, count in value.items()} if field == 'confidence_bins' else -value)
+                for field, value in increments.items()
+            })
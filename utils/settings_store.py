@@ -0,0 +1,175 @@
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+DEFAULT_SETTINGS = {
+    'confidence_threshold': 0.5,
+    'tracking_threshold': 0.3,
+    'movement_threshold': 50,
+    'frame_skip': 3,
+    'classes_to_detect': (53,),
+    # Counting rule; see utils.counting
+    'vertical_threshold': 30,
+    'min_track_length': 20,
+    'track_window': 60
+}
+
+# The live settings are one document; every persisted version also goes to history
+CURRENT_SETTINGS_ID = 'current'
+SETTINGS_HISTORY_LIMIT = 50
+PERSIST_DEBOUNCE_SECONDS = 1.0
+
+# Immutable view handed to running jobs
+SettingsSnapshot = namedtuple('SettingsSnapshot', ['version'] + list(DEFAULT_SETTINGS.keys()))
+
+def _normalize(key, value):
+    if key == 'classes_to_detect':
+        return tuple(int(class_id) for class_id in value)
+    return value
+
+class SettingsStore:
+    """In-memory, versioned model settings with debounced persistence.
+
+    Reads never touch MongoDB. Every change bumps the version; changes made
+    within PERSIST_DEBOUNCE_SECONDS of each other are written as a single
+    upsert of the current document plus one capped history entry. Nothing
+    is written until the stored settings have been loaded, so a store that
+    started with defaults while MongoDB was down never overwrites them;
+    changes made meanwhile are applied on top once load() succeeds.
+    """
+
+    def __init__(self, collection=None, history_collection=None, db_write=None,
+                 debounce_seconds=PERSIST_DEBOUNCE_SECONDS, history_limit=SETTINGS_HISTORY_LIMIT):
+        self.collection = collection
+        self.history_collection = history_collection
+        self.db_write = db_write
+        self.debounce_seconds = debounce_seconds
+        self.history_limit = history_limit
+        self._lock = threading.Lock()
+        self._timer = None
+        self._values = dict(DEFAULT_SETTINGS)
+        self._version = 0
+        self._persisted_version = 0
+        self._loaded = collection is None
+        # Keys changed before the stored settings were loaded
+        self._unloaded_changes = set()
+
+    def attach(self, collection, history_collection):
+        """Start persisting to collections that became available after startup"""
+        with self._lock:
+            self.collection = collection
+            self.history_collection = history_collection
+            self._loaded = collection is None
+
+    @property
+    def version(self):
+        return self._version
+
+    def load(self):
+        """Load the current settings document, migrating the legacy latest document once"""
+        if self.collection is None:
+            return self.snapshot()
+        try:
+            doc = self.collection.find_one({'_id': CURRENT_SETTINGS_ID})
+            if doc is None:
+                # Older versions inserted a new document per change
+                doc = self.collection.find_one({'_id': {'$ne': CURRENT_SETTINGS_ID}}, sort=[('created_at', -1)])
+            with self._lock:
+                local = {key: self._values[key] for key in self._unloaded_changes}
+                stored_version = int(doc.get('version', 1)) if doc else 0
+                if doc:
+                    for key in DEFAULT_SETTINGS:
+                        if key in doc:
+                            self._values[key] = _normalize(key, doc[key])
+                self._values.update(local)
+                self._version = max(self._version, stored_version) + (1 if local else 0)
+                self._persisted_version = stored_version if local else self._version
+                self._unloaded_changes.clear()
+                self._loaded = True
+        except Exception as e:
+            print(f"Error loading settings: {e}")
+            return self.snapshot()
+        if local:
+            self.flush()
+        return self.snapshot()
+
+    def ensure_defaults(self):
+        """Create the current settings document if it does not exist yet"""
+        if self.collection is None or self.db_write is None:
+            return
+        with self._lock:
+            values = dict(self._values, classes_to_detect=list(self._values['classes_to_detect']))
+            version = max(self._version, 1)
+        self.db_write(
+            self.collection, 'update_one',
+            {'_id': CURRENT_SETTINGS_ID},
+            {'$setOnInsert': dict(values, version=version, created_at=datetime.now())},
+            upsert=True
+        )
+
+    def snapshot(self):
+        """Immutable copy of the current settings and their version"""
+        with self._lock:
+            return SettingsSnapshot(version=self._version, **self._values)
+
+    def get(self, key):
+        return self._values[key]
+
+    def update(self, **changes):
+        """Apply changes in memory and schedule a debounced write. Returns the version."""
+        with self._lock:
+            changed = False
+            for key, value in changes.items():
+                if key not in DEFAULT_SETTINGS:
+                    raise KeyError(f"Unknown setting: {key}")
+                value = _normalize(key, value)
+                if self._values[key] != value:
+                    self._values[key] = value
+                    changed = True
+                    if not self._loaded:
+                        self._unloaded_changes.add(key)
+            if not changed:
+                return self._version
+
+            self._version += 1
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+            return self._version
+
+    def flush(self):
+        """Persist pending changes now"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._version == self._persisted_version or self.db_write is None:
+                return
+            loaded = self._loaded
+        if not loaded:
+            # load() flushes these changes on top of the stored settings once it succeeds
+            self.load()
+            return
+        with self._lock:
+            if self._version == self._persisted_version:
+                return
+            version = self._version
+            values = dict(self._values, classes_to_detect=list(self._values['classes_to_detect']))
+            self._persisted_version = version
+
+        now = datetime.now()
+        self.db_write(
+            self.collection, 'update_one',
+            {'_id': CURRENT_SETTINGS_ID},
+            {'$set': dict(values, version=version, updated_at=now)},
+            upsert=True
+        )
+        if self.history_collection is not None:
+            self.db_write(self.history_collection, 'insert_one', dict(values, version=version, created_at=now))
+            # Keep only the most recent history_limit versions
+            self.db_write(
+                self.history_collection, 'delete_many',
+                {'version': {'$lte': version - self.history_limit}}
+            )
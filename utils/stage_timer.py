@@ -0,0 +1,85 @@
+import math
+import os
+import time
+from bisect import bisect_left
+
+# Set PIZZA_STAGE_TIMING=0 to turn per-stage timing off
+STAGE_TIMING_ENABLED = os.getenv("PIZZA_STAGE_TIMING", "1") not in ("0", "false", "False")
+
+# Log-spaced histogram bucket upper bounds: 10µs to ~100s, ~10% apart
+_BUCKET_BOUNDS = [1e-5 * 1.1 ** i for i in range(int(math.log(1e7) / math.log(1.1)) + 2)]
+
+class StageHistogram:
+    """Fixed-size latency histogram; percentiles are accurate to one bucket (~10%)"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(_BUCKET_BOUNDS[index] if index < len(_BUCKET_BOUNDS) else self.max, self.max)
+        return self.max
+
+class StageTimer:
+    """Per-stage latency histograms for one processing job.
+
+    Usage in a hot loop:
+        start = timer.now()
+        ...stage work...
+        timer.add('inference', start)
+    When disabled both calls return immediately.
+    """
+
+    def __init__(self, enabled=STAGE_TIMING_ENABLED):
+        self.enabled = enabled
+        self.stages = {}
+        self._started = time.perf_counter()
+
+    def now(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def add(self, stage, start):
+        """Record the time since start (from now()) against a stage"""
+        if not self.enabled:
+            return
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = StageHistogram()
+        histogram.add(time.perf_counter() - start)
+
+    def summary(self):
+        """Milliseconds per stage with p50/p95/p99, or None when disabled"""
+        if not self.enabled:
+            return None
+        wall = time.perf_counter() - self._started
+        stages = {}
+        for stage, histogram in self.stages.items():
+            stages[stage] = {
+                'count': histogram.count,
+                'total_ms': round(histogram.total * 1000, 1),
+                'mean_ms': round(histogram.total / histogram.count * 1000, 3) if histogram.count else 0.0,
+                'p50_ms': round(histogram.percentile(50) * 1000, 3),
+                'p95_ms': round(histogram.percentile(95) * 1000, 3),
+                'p99_ms': round(histogram.percentile(99) * 1000, 3),
+                'max_ms': round(histogram.max * 1000, 3),
+                'share': round(histogram.total / wall, 3) if wall > 0 else 0.0
+            }
+        return {'wall_seconds': round(wall, 2), 'stages': stages}
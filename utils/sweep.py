@@ -0,0 +1,120 @@
+import itertools
+import time
+import numpy as np
+
+from utils.counting import ENDPOINT_SAMPLES, MIN_MOVEMENT_DISTANCE
+
+# movement_threshold below MIN_MOVEMENT_DISTANCE behaves like MIN_MOVEMENT_DISTANCE
+DEFAULT_SWEEP_GRID = {
+    'confidence_threshold': [0.5],
+    'movement_threshold': [50, 60, 75, 100, 125, 150],
+    'vertical_threshold': [10, 20, 30, 45, 60],
+    'min_track_length': [10, 15, 20, 30],
+    'track_window': [30, 60, 90]
+}
+SWEEP_PARAMETERS = tuple(DEFAULT_SWEEP_GRID.keys())
+
+def _track_sequences(columns, class_id, confidence_threshold):
+    """Filtered centers ordered by (track, frame), with the start offset of each track"""
+    mask = columns['class_id'] == class_id
+    mask &= columns['confidence'] > confidence_threshold
+    track_ids = columns['track_id'][mask]
+    frames = columns['frame'][mask]
+    x = ((columns['x1'][mask] + columns['x2'][mask]) / 2).astype(np.float64)
+    y = ((columns['y1'][mask] + columns['y2'][mask]) / 2).astype(np.float64)
+
+    order = np.lexsort((frames, track_ids))
+    track_ids, x, y = track_ids[order], x[order], y[order]
+    starts = np.flatnonzero(np.r_[True, track_ids[1:] != track_ids[:-1]]) if len(track_ids) else np.empty(0, int)
+    return track_ids, x, y, starts
+
+def _window_features(x, y, starts, window):
+    """Window length, endpoint distance and upward movement after every observation.
+
+    Mirrors CountingState: after appending observation k of a track, the
+    window holds its last `window` positions, and the first and last
+    ENDPOINT_SAMPLES of the window are averaged. Prefix sums make each
+    window mean O(1), so all observations are evaluated at once.
+    """
+    count = len(x)
+    # Index of each observation's track start, and its position within the track
+    track_start = np.repeat(starts, np.diff(np.r_[starts, count]))
+    position = np.arange(count) - track_start
+
+    sum_x = np.r_[0.0, np.cumsum(x)]
+    sum_y = np.r_[0.0, np.cumsum(y)]
+    end = np.arange(count) + 1
+    begin = track_start + np.maximum(0, position + 1 - window)
+    length = end - begin
+    samples = np.minimum(ENDPOINT_SAMPLES, length)
+
+    initial_x = (sum_x[begin + samples] - sum_x[begin]) / samples
+    initial_y = (sum_y[begin + samples] - sum_y[begin]) / samples
+    recent_x = (sum_x[end] - sum_x[end - samples]) / samples
+    recent_y = (sum_y[end] - sum_y[end - samples]) / samples
+
+    distance = np.hypot(recent_x - initial_x, recent_y - initial_y)
+    vertical = initial_y - recent_y
+    return length, distance, vertical
+
+def sweep_tracks(columns, grid=None, class_id=53, labels=None):
+    """Evaluate every combination of counting parameters over recorded tracks.
+
+    labels maps track_id -> True (a correct count) / False (a false count)
+    from user feedback. Returns one row per combination with its pizza count
+    and, when labels exist, the share of labeled tracks the combination
+    agrees with (counts the correct ones, skips the false ones).
+    """
+    grid = dict(DEFAULT_SWEEP_GRID, **(grid or {}))
+    started = time.perf_counter()
+
+    movement = np.maximum(np.asarray(grid['movement_threshold'], dtype=float), MIN_MOVEMENT_DISTANCE)
+    vertical_thresholds = np.asarray(grid['vertical_threshold'], dtype=float)
+    min_lengths = np.asarray(grid['min_track_length'])
+    labels = labels or {}
+
+    rows = []
+    for confidence in grid['confidence_threshold']:
+        track_ids, x, y, starts = _track_sequences(columns, class_id, confidence)
+        unique_ids = track_ids[starts] if len(starts) else np.empty(0, int)
+        label_mask = np.isin(unique_ids, list(labels)) if labels else np.zeros(len(unique_ids), bool)
+        label_values = np.array([labels[int(track_id)] for track_id in unique_ids[label_mask]], bool)
+        # Correct tracks filtered out by this confidence can never be counted
+        present = set(unique_ids.tolist())
+        missed_correct = sum(1 for track_id, correct in labels.items() if correct and track_id not in present)
+
+        for window in grid['track_window']:
+            if len(x):
+                length, distance, vertical = _window_features(x, y, starts, window)
+                # (min_length, movement, vertical, observation)
+                removed = ((length[None, None, None, :] > min_lengths[:, None, None, None]) &
+                           (distance[None, None, None, :] > movement[None, :, None, None]) &
+                           (vertical[None, None, None, :] > vertical_thresholds[None, None, :, None]))
+                # A track counts once if any of its observations qualifies
+                counted = np.logical_or.reduceat(removed, starts, axis=-1)
+            else:
+                counted = np.zeros((len(min_lengths), len(movement), len(vertical_thresholds), 0), bool)
+            counts = counted.sum(axis=-1)
+
+            # Tracks missing at this confidence agree with no combination
+            agree = (counted[..., label_mask] == label_values).sum(axis=-1)
+            labeled = int(label_mask.sum()) + missed_correct
+
+            for (i, min_length), (j, movement_threshold), (k, vertical_threshold) in itertools.product(
+                    enumerate(grid['min_track_length']), enumerate(grid['movement_threshold']),
+                    enumerate(grid['vertical_threshold'])):
+                rows.append({
+                    'confidence_threshold': confidence,
+                    'movement_threshold': movement_threshold,
+                    'vertical_threshold': vertical_threshold,
+                    'min_track_length': min_length,
+                    'track_window': window,
+                    'pizza_count': int(counts[i, j, k]),
+                    'agreement': round(int(agree[i, j, k]) / labeled, 3) if labeled else None,
+                    'labeled': labeled
+                })
+
+    return {
+        'combinations': rows,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+# Bucket widths tried in order; the first that fits MAX_TIMELINE_BUCKETS wins
+TIMELINE_BUCKET_SECONDS = (1, 60, 3600)
+# One hour at 1 s buckets, 60 hours at 1 min; keeps the video document small
+MAX_TIMELINE_BUCKETS = 3600
+
+def choose_bucket_seconds(duration_seconds):
+    """Finest bucket width that covers duration_seconds within MAX_TIMELINE_BUCKETS"""
+    for bucket_seconds in TIMELINE_BUCKET_SECONDS:
+        if duration_seconds <= bucket_seconds * MAX_TIMELINE_BUCKETS:
+            return bucket_seconds
+    return TIMELINE_BUCKET_SECONDS[-1]
+
+class TimelineBuilder:
+    """Per-bucket pizza counts and track activity, built while a video is processed.
+
+    For each bucket it keeps pizzas counted, new pizza tracks seen and the
+    peak number of pizza tracks in one frame. Memory is O(buckets) plus
+    the set of track IDs seen so far.
+    """
+
+    def __init__(self, fps, total_frames=0, bucket_seconds=None, started_at=None):
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.bucket_seconds = bucket_seconds or choose_bucket_seconds(total_frames / self.fps)
+        self.started_at = started_at
+        self.counts = []
+        self.new_tracks = []
+        self.active = []
+        self._seen_tracks = set()
+
+    def _bucket(self, frame_count):
+        index = int((frame_count - 1) / self.fps // self.bucket_seconds)
+        missing = index + 1 - len(self.counts)
+        if missing > 0:
+            self.counts.extend([0] * missing)
+            self.new_tracks.extend([0] * missing)
+            self.active.extend([0] * missing)
+        return index
+
+    def observe(self, frame_count, track_ids, counted=0):
+        """Record one sampled frame: its pizza track IDs and how many were counted on it"""
+        index = self._bucket(frame_count)
+        self.counts[index] += counted
+        if len(track_ids) > self.active[index]:
+            self.active[index] = len(track_ids)
+        for track_id in track_ids:
+            if track_id not in self._seen_tracks:
+                self._seen_tracks.add(track_id)
+                self.new_tracks[index] += 1
+
+    def to_dict(self, total_frames=None):
+        """Timeline document stored on the video record"""
+        if total_frames:
+            # Trailing frames with no sampled detections still belong to the timeline
+            self._bucket(total_frames)
+        return {
+            'bucket_seconds': self.bucket_seconds,
+            'fps': self.fps,
+            'started_at': self.started_at,
+            'counts': self.counts,
+            'new_tracks': self.new_tracks,
+            'active': self.active,
+            'total': sum(self.counts)
+        }
+
+def _offset_seconds(timeline, value):
+    if isinstance(value, datetime):
+        if timeline.get('started_at') is None:
+            raise ValueError("Timeline has no recording start time; use offsets in seconds")
+        return (value - timeline['started_at']).total_seconds()
+    return float(value)
+
+def bucket_range(timeline, start=None, end=None):
+    """Indices [first, last) of the buckets starting inside [start, end).
+
+    start and end are offsets in seconds from the start of the video, or
+    datetimes when the timeline has a started_at.
+    """
+    bucket_seconds = timeline['bucket_seconds']
+    size = len(timeline['counts'])
+    first = 0 if start is None else int(-(-_offset_seconds(timeline, start) // bucket_seconds))
+    last = size if end is None else int(-(-_offset_seconds(timeline, end) // bucket_seconds))
+    return max(0, min(first, size)), max(0, min(last, size))
+
+def count_in_range(timeline, start=None, end=None):
+    """Pizzas counted between start and end, to bucket precision"""
+    first, last = bucket_range(timeline, start, end)
+    return sum(timeline['counts'][first:last])
+
+def timeline_rows(timeline, start=None, end=None):
+    """Per-bucket rows (offset or time, counts, cumulative, activity) for charts and tables"""
+    first, last = bucket_range(timeline, start, end)
+    bucket_seconds = timeline['bucket_seconds']
+    started_at = timeline.get('started_at')
+    cumulative = sum(timeline['counts'][:first])
+    rows = []
+    for index in range(first, last):
+        cumulative += timeline['counts'][index]
+        offset = index * bucket_seconds
+        rows.append({
+            'time': started_at + timedelta(seconds=offset) if started_at else offset,
+            'pizzas': timeline['counts'][index],
+            'cumulative': cumulative,
+            'new_tracks': timeline['new_tracks'][index],
+            'active_tracks': timeline['active'][index]
+        })
+    return rows
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.model_pool import TrackedDetections
+
+# Per-video track files (kept out of the library listing)
+TRACKS_FOLDER = os.getenv("PIZZA_TRACKS_DIR", "./videos/tracks")
+RECORD_TRACKS = os.getenv("PIZZA_RECORD_TRACKS", "1") not in ("0", "false", "False")
+# Rows buffered before a Parquet row group is flushed
+TRACK_ROW_GROUP_SIZE = 50000
+
+TRACK_SCHEMA = pa.schema([
+    ('frame', pa.int32()),
+    ('track_id', pa.int32()),
+    ('class_id', pa.int16()),
+    ('confidence', pa.float32()),
+    ('x1', pa.float32()),
+    ('y1', pa.float32()),
+    ('x2', pa.float32()),
+    ('y2', pa.float32())
+])
+
+def get_tracks_path(filename, output_folder=TRACKS_FOLDER):
+    """Build the track file path for a source video filename"""
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(output_folder, f"{stem}_tracks.parquet")
+
+class TrackRecorder:
+    """Appends every sampled frame's tracked boxes to a Parquet file.
+
+    Rows are buffered as NumPy arrays and flushed as row groups, so memory
+    stays bounded on long videos. Recording settings go into the file
+    metadata because recounts cannot go below the recorded confidence.
+    """
+
+    def __init__(self, path, metadata=None, row_group_size=TRACK_ROW_GROUP_SIZE):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self.frames = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        schema = TRACK_SCHEMA.with_metadata({b'pizza_counter': json.dumps(metadata or {}, default=str).encode()})
+        self._temp_path = path + '.part'
+        self._writer = pq.ParquetWriter(self._temp_path, schema, compression='zstd')
+        self._pending = []
+        self._pending_rows = 0
+
+    def add(self, frame, tracked):
+        """Record one sampled frame's TrackedDetections"""
+        self.frames += 1
+        count = len(tracked)
+        if not count:
+            return
+        self._pending.append((np.full(count, frame, dtype=np.int32), tracked))
+        self._pending_rows += count
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        frames = np.concatenate([frame for frame, _ in self._pending])
+        xyxy = np.concatenate([tracked.xyxy for _, tracked in self._pending]).astype(np.float32)
+        table = pa.Table.from_arrays([
+            pa.array(frames),
+            pa.array(np.concatenate([tracked.track_ids for _, tracked in self._pending]).astype(np.int32)),
+            pa.array(np.concatenate([tracked.classes for _, tracked in self._pending]).astype(np.int16)),
+            pa.array(np.concatenate([tracked.confidences for _, tracked in self._pending]).astype(np.float32)),
+            pa.array(xyxy[:, 0]), pa.array(xyxy[:, 1]), pa.array(xyxy[:, 2]), pa.array(xyxy[:, 3])
+        ], schema=self._writer.schema)
+        self._writer.write_table(table)
+        self.rows += len(frames)
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self):
+        """Finish the file and return a summary for the video record"""
+        self._flush()
+        self._writer.close()
+        os.replace(self._temp_path, self.path)
+        return {
+            'path': self.path,
+            'rows': self.rows,
+            'frames': self.frames,
+            'size_bytes': os.path.getsize(self.path)
+        }
+
+    def abort(self):
+        self._writer.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+def load_tracks(path):
+    """Load a track file as NumPy columns plus its recording metadata"""
+    table = pq.read_table(path)
+    raw = (table.schema.metadata or {}).get(b'pizza_counter', b'{}')
+    columns = {name: table.column(name).to_numpy() for name in table.column_names}
+    return columns, json.loads(raw)
+
+def iter_frames(columns, class_id=None, confidence_threshold=None):
+    """Yield (frame, TrackedDetections) per recorded frame, optionally filtered"""
+    mask = np.ones(len(columns['frame']), dtype=bool)
+    if class_id is not None:
+        mask &= columns['class_id'] == class_id
+    if confidence_threshold is not None:
+        mask &= columns['confidence'] > confidence_threshold
+
+    frames = columns['frame'][mask]
+    if not len(frames):
+        return
+    xyxy = np.stack([columns['x1'][mask], columns['y1'][mask], columns['x2'][mask], columns['y2'][mask]], axis=1)
+    track_ids = columns['track_id'][mask].astype(int)
+    confidences = columns['confidence'][mask]
+    classes = columns['class_id'][mask].astype(int)
+
+    # Rows are written in frame order, so each frame is one contiguous slice
+    starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+    ends = np.r_[starts[1:], len(frames)]
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        yield int(frames[start]), TrackedDetections(
+            xyxy[start:end], track_ids[start:end], confidences[start:end], classes[start:end]
+        )
+
+def recount_tracks(columns, counting, confidence_threshold, class_id=53, timeline=None):
+    """Re-run only the counting rule over recorded tracks into a fresh CountingState.
+
+    A TimelineBuilder, if given, is rebuilt alongside with the new counts.
+    """
+    start = time.perf_counter()
+    detections = []
+    for frame, pizzas in iter_frames(columns, class_id, confidence_threshold):
+        counted = counting.observe(pizzas, frame)
+        if timeline is not None:
+            timeline.observe(frame, pizzas.track_ids.tolist(), len(counted))
+        detections.extend(counted)
+    return {
+        'pizza_count': counting.pizza_count,
+        'detections': detections,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
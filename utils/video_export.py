@@ -0,0 +1,169 @@
+import cv2
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import numpy as np
+
+# Default location for annotated exports (kept out of the library listing)
+ANNOTATED_FOLDER = "./videos/annotated"
+
+DEFAULT_EXPORT_OPTIONS = {
+    'output_width': None,      # None keeps the source resolution
+    'bitrate_kbps': None,      # Needs ffmpeg on PATH, otherwise OpenCV defaults are used (None: x264 CRF 23)
+    'queue_size': 64
+}
+
+def get_annotated_path(filename, output_folder=ANNOTATED_FOLDER):
+    """Build the export path for a source video filename"""
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(output_folder, f"{stem}_annotated.mp4")
+
+def draw_tracks(frame, xyxy, track_ids, confidences, pizza_count, color=(0, 255, 0)):
+    """Draw tracked boxes, track IDs and a running count overlay in place"""
+    for (x1, y1, x2, y2), track_id, conf in zip(np.asarray(xyxy).round().astype(int).tolist(),
+                                                track_ids, confidences):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, f'Pizza {track_id}: {conf:.2f}', (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    cv2.rectangle(frame, (10, 10), (230, 50), (0, 0, 0), -1)
+    cv2.putText(frame, f'Pizzas counted: {pizza_count}', (20, 38),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    return frame
+
+class AnnotatedVideoWriter:
+    """Encode annotated frames to MP4 on a background thread fed by a bounded queue.
+
+    write() never blocks: when the encoder falls behind, frames are dropped
+    and counted instead of stalling inference.
+    """
+
+    def __init__(self, output_path, fps, frame_size, output_width=None, bitrate_kbps=None, queue_size=64):
+        self.output_path = output_path
+        self.fps = fps if fps and fps > 0 else 25
+        source_width, source_height = frame_size
+
+        if output_width and output_width < source_width:
+            self.scale = output_width / source_width
+            # Even dimensions keep H.264 encoders happy
+            self.frame_size = (int(output_width) // 2 * 2, int(source_height * self.scale) // 2 * 2)
+        else:
+            self.scale = 1.0
+            self.frame_size = (source_width // 2 * 2, source_height // 2 * 2)
+
+        self.bitrate_kbps = bitrate_kbps
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.error = None
+        self.codec = None
+        self.warning = None
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._writer = None
+        self._process = None
+
+    def start(self):
+        """Open the encoder and start the writer thread"""
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+
+        # Browsers only play H.264 MP4s: ffmpeg/libx264 when available, then
+        # OpenCV's avc1, and mp4v (download only) as a last resort
+        if shutil.which("ffmpeg"):
+            width, height = self.frame_size
+            rate = ["-b:v", f"{int(self.bitrate_kbps)}k"] if self.bitrate_kbps else ["-crf", "23"]
+            self._process = subprocess.Popen(
+                ["ffmpeg", "-y", "-loglevel", "error",
+                 "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+                 "-r", str(self.fps), "-i", "-",
+                 "-c:v", "libx264", "-pix_fmt", "yuv420p", *rate,
+                 "-movflags", "+faststart", self.output_path],
+                stdin=subprocess.PIPE
+            )
+            self.codec = 'h264'
+        else:
+            if self.bitrate_kbps:
+                print("⚠️ ffmpeg not found, exporting with OpenCV default bitrate")
+            for fourcc in ('avc1', 'mp4v'):
+                self._writer = cv2.VideoWriter(
+                    self.output_path, cv2.VideoWriter_fourcc(*fourcc), self.fps, self.frame_size
+                )
+                if self._writer.isOpened():
+                    self.codec = fourcc
+                    break
+                self._writer.release()
+            else:
+                raise Exception(f"Could not open video writer for {self.output_path}")
+            if self.codec == 'mp4v':
+                self.warning = "Exported as MPEG-4 (mp4v): browsers cannot play it; install ffmpeg for H.264"
+                print(f"⚠️ {self.warning}")
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def write(self, frame, xyxy, track_ids, confidences, pizza_count):
+        """Queue a frame for annotation and encoding. Returns False if it was dropped."""
+        try:
+            self._queue.put_nowait((frame, xyxy, track_ids, confidences, pizza_count))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def close(self):
+        """Flush queued frames, finalize the file and return export stats"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+            except (BrokenPipeError, OSError) as e:
+                # ffmpeg already exited; the count itself is unaffected
+                self.error = self.error or f"ffmpeg exited early: {e}"
+            if self._process.wait() != 0 and not self.error:
+                self.error = f"ffmpeg exited with code {self._process.returncode}"
+            self._process = None
+
+        return {
+            'path': self.output_path,
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+            'resolution': f"{self.frame_size[0]}x{self.frame_size[1]}",
+            'codec': self.codec,
+            'warning': self.warning,
+            'error': self.error
+        }
+
+    def _run(self):
+        """Writer thread: annotate, resize and encode queued frames"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error:
+                continue
+
+            frame, xyxy, track_ids, confidences, pizza_count = item
+            try:
+                if self.scale != 1.0 or frame.shape[1::-1] != self.frame_size:
+                    frame = cv2.resize(frame, self.frame_size, interpolation=cv2.INTER_AREA)
+                    xyxy = np.asarray(xyxy) * self.scale
+                draw_tracks(frame, xyxy, track_ids, confidences, pizza_count)
+
+                if self._process is not None:
+                    self._process.stdin.write(frame.tobytes())
+                else:
+                    self._writer.write(frame)
+                self.frames_written += 1
+            except Exception as e:
+                self.error = str(e)
+                print(f"Annotated export error: {e}")